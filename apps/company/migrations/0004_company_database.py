@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0003_provisioningjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='database',
+            field=models.CharField(default='default', help_text='Alias de la base (settings.DATABASES) hébergeant le schéma de ce tenant.', max_length=63),
+        ),
+    ]
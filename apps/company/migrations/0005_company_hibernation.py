@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0004_company_database'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='hibernated_at',
+            field=models.DateTimeField(blank=True, help_text="Date d'archivage du schéma (tenant en hibernation), vide si le schéma est en base.", null=True),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='last_activity',
+            field=models.DateField(blank=True, help_text='Dernier jour où le tenant a reçu une requête.', null=True),
+        ),
+    ]
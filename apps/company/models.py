@@ -1,7 +1,7 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
-from kake.models.mixins import TenantMixin, DomainMixin
+from kake.models.mixins import TenantMixin, DomainMixin, ProvisioningJobMixin
 from apps.users.models import User
 import uuid
 
@@ -70,6 +70,10 @@ class Domain(DomainMixin):
     pass
 
 
+class ProvisioningJob(ProvisioningJobMixin):
+    pass
+
+
 class Payment(models.Model):
     subscription = models.ForeignKey(Subscription, on_delete=models.CASCADE, related_name='payments')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -0,0 +1,59 @@
+from kake.reporting import TenantReport
+
+# Rapports inter-tenants consultés par les administrateurs de la plateforme
+# (modèles déclarés dans TENANT_REPORT_MODELS)
+REPORTS = {
+    'egg_production': TenantReport(
+        name='egg_production',
+        model='management.EggCollection',
+        columns=[
+            ('month', "date_trunc('month', t.collection_date)::date"),
+            ('eggs', 'sum(t.quantity)'),
+            ('cracked', 'sum(t.craked)'),
+        ],
+        group_by="date_trunc('month', t.collection_date)",
+    ),
+    'batches': TenantReport(
+        name='batches',
+        model='management.Batch',
+        columns=[
+            ('status', 't.status'),
+            ('batches', 'count(*)'),
+            ('poultry', 'sum(t.arrival_quantity)'),
+        ],
+        group_by='t.status',
+    ),
+    'orders': TenantReport(
+        name='orders',
+        model='ventes.Order',
+        columns=[
+            ('month', "date_trunc('month', t.created_at)::date"),
+            ('orders', 'count(*)'),
+            ('revenue', 'sum(t.total_amount)'),
+        ],
+        where='t.status = %s',
+        group_by="date_trunc('month', t.created_at)",
+        params=['completed'],
+    ),
+    'payments': TenantReport(
+        name='payments',
+        model='ventes.Payment',
+        columns=[
+            ('month', "date_trunc('month', coalesce(t.payment_date, t.created_at))::date"),
+            ('currency', 't.currency'),
+            ('payments', 'count(*)'),
+            ('amount', 'sum(t.amount)'),
+        ],
+        where='t.payment_status = %s',
+        group_by="date_trunc('month', coalesce(t.payment_date, t.created_at)), t.currency",
+        params=['paid'],
+    ),
+}
+
+# Colonnes de regroupement des totaux plateforme
+REPORT_TOTALS_BY = {
+    'egg_production': ('month',),
+    'batches': ('status',),
+    'orders': ('month',),
+    'payments': ('month', 'currency'),
+}
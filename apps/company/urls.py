@@ -7,6 +7,13 @@ urlpatterns = [
     path('companies/print/', views.company_list_print, name='company_list_print'),
     path('companies/export/', views.company_list_export, name='company_list_export'),
     
+    # Suivi de la création du tenant
+    path('companies/<uuid:id>/provisioning/', views.company_provisioning_status, name='company_provisioning_status'),
+    path('companies/<uuid:id>/provisioning/retry/', views.retry_company_provisioning, name='retry_company_provisioning'),
+
+    # Rapports agrégés sur tous les tenants
+    path('companies/reports/<str:name>/', views.company_report, name='company_report'),
+
     # Mise à jour d'une compagnie
     path('companies/update/<uuid:id>/', views.update_company, name='update_company'),
     
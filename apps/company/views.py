@@ -1,16 +1,19 @@
 import os
 import json
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q
-from openpyxl import Workbook
+from apps.users.exports import export_response, Column, choice_label
 from django.conf import settings
 from kake.views.mixins import TenantCreationMixin
-from .models import Company, Subscription, Domain, Payment
+from kake.provisioning import enqueue_provisioning, retry_job
+from kake.reporting import run_report, report_totals
+from .models import Company, Subscription, Domain, Payment, ProvisioningJob
+from .reports import REPORTS, REPORT_TOTALS_BY
 from .forms import CompanyForm, SubscriptionForm, PaymentForm  # Ensure you have these forms
 from apps.users.decorators import role_required
 
@@ -33,16 +36,15 @@ def company_list(request):
                 company = form.save()
                 print(request.user.role)
 
-                # Créer et migrer le tenant
-                tenant_creation_mixin = TenantCreationMixin()
-                tenant_creation_mixin.create_and_migrate_tenant(
-                    name=company.name,
+                # Créer et migrer le tenant en arrière-plan (commande run_provisioning_jobs)
+                enqueue_provisioning(
+                    tenant=company,
                     schema_name=company.name.lower().replace(' ', '_'),
                     domain=company.name.lower().replace(' ', '-') + '.localhost:8000',
                     user=request.user  # Transmettre l'utilisateur ici
                 )
 
-                messages.success(request, "La compagnie a été créée avec succès.")
+                messages.success(request, "La compagnie a été créée, son espace est en cours de préparation.")
                 return redirect('company_list')
             except Exception as e:
                 company.delete()
@@ -54,6 +56,57 @@ def company_list(request):
 
     return render(request, 'apps/companies/list.html', {'companies': page_obj, 'form': form})
 
+# Statut de la création du tenant, interrogé périodiquement par la liste des compagnies
+@login_required(login_url='login')
+@role_required(excluded_roles=['customer','cashier','veterinarian','accountant','employee','farmer']) 
+def company_provisioning_status(request, id):
+    job = ProvisioningJob.objects.filter(tenant_id=id).order_by('-created_at').first()
+    if job is None:
+        return JsonResponse({'status': 'error', 'message': 'Aucune création en cours pour cette compagnie.'}, status=404)
+
+    return JsonResponse({
+        'status': job.status,
+        'completed_steps': job.completed_steps,
+        'steps': len(TenantCreationMixin.PROVISIONING_STEPS),
+        'attempts': job.attempts,
+        'error': job.error,
+    })
+
+# Nouvelle tentative d'une création en échec
+@csrf_exempt
+@login_required(login_url='login')
+@role_required(excluded_roles=['customer','cashier','veterinarian','accountant','employee','farmer']) 
+def retry_company_provisioning(request, id):
+    if request.method == 'POST':
+        job = ProvisioningJob.objects.filter(tenant_id=id).order_by('-created_at').first()
+        if job is None or not retry_job(job):
+            return JsonResponse({'status': 'error', 'message': 'Aucune création en échec pour cette compagnie.'}, status=400)
+        return JsonResponse({'status': 'success', 'message': 'La création a été relancée.'})
+
+    return JsonResponse({'status': 'error', 'message': 'Méthode non autorisée.'}, status=405)
+
+# Rapport agrégé sur l'ensemble des compagnies (une requête pour tous les schémas)
+@login_required(login_url='login')
+@role_required(excluded_roles=['customer','cashier','veterinarian','accountant','employee','farmer']) 
+def company_report(request, name):
+    report = REPORTS.get(name)
+    if report is None:
+        return JsonResponse({'status': 'error', 'message': 'Rapport inconnu.'}, status=404)
+
+    companies = dict(Company.objects.values_list('schema_name', 'name'))
+    rows = list(run_report(report, schema_names=sorted(companies)))
+    columns = report.column_names
+
+    return JsonResponse({
+        'report': name,
+        'columns': columns,
+        'companies': [
+            {'company': companies.get(row[0]), **dict(zip(columns, row))}
+            for row in rows
+        ],
+        'totals': report_totals(report, rows, REPORT_TOTALS_BY.get(name, ())),
+    })
+
 # Vue pour impression
 @login_required(login_url='login')
 @role_required(excluded_roles=['customer','cashier','veterinarian','accountant','employee','farmer']) 
@@ -69,19 +122,14 @@ def company_list_export(request):
     query = request.GET.get('q')
     companies = Company.objects.filter(Q(name__icontains=query)).distinct() if query else Company.objects.all()
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Companies"
-    ws.append(["ID", "Name", "Email", "Phone", "Subscription Plan", "Active"])
-
-    for company in companies:
-        ws.append([company.id, company.name, company.email, company.phone, company.subscription_plan, company.is_active])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=companies.xlsx'
-    wb.save(response)
-
-    return response
+    return export_response(request, companies.order_by('name'), [
+        Column("ID", 'id'),
+        Column("Name", 'name'),
+        Column("Email", 'email'),
+        Column("Phone", 'phone'),
+        Column("Subscription Plan", 'subscription_plan'),
+        Column("Active", 'is_active'),
+    ], 'companies', title="Companies")
 
 # Mise à jour d'une compagnie
 @csrf_exempt
@@ -174,19 +222,14 @@ def subscription_list_export(request):
     query = request.GET.get('q')
     subscriptions = Subscription.objects.filter(Q(company__name__icontains=query)).distinct() if query else Subscription.objects.all()
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Subscriptions"
-    ws.append(["ID", "Company", "Plan", "Start Date", "End Date", "Active"])
-
-    for sub in subscriptions:
-        ws.append([sub.id, sub.company.name, sub.get_plan_display(), sub.start_date, sub.end_date, sub.active])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=subscriptions.xlsx'
-    wb.save(response)
-
-    return response
+    return export_response(request, subscriptions.order_by('id'), [
+        Column("ID", 'id'),
+        Column("Company", 'company__name'),
+        Column("Plan", 'plan', choice_label(Subscription, 'plan')),
+        Column("Start Date", 'start_date'),
+        Column("End Date", 'end_date'),
+        Column("Active", 'active'),
+    ], 'subscriptions', title="Subscriptions")
 
 # Mise à jour d'un abonnement
 @csrf_exempt
@@ -257,19 +300,16 @@ def payment_list_export(request):
     query = request.GET.get('q')
     payments = Payment.objects.filter(Q(subscription__company__name__icontains=query)).distinct() if query else Payment.objects.all()
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Payments"
-    ws.append(["ID", "Subscription", "Amount", "Payment Status", "Payment Method", "Transaction ID", "Payment Date", "Remark"])
-
-    for payment in payments:
-        ws.append([payment.id, payment.subscription.id, payment.amount, payment.get_payment_status_display(), payment.get_payment_method_display(), payment.transaction_id, payment.payment_date, payment.remark])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=payments.xlsx'
-    wb.save(response)
-
-    return response
+    return export_response(request, payments.order_by('id'), [
+        Column("ID", 'id'),
+        Column("Subscription", 'subscription_id'),
+        Column("Amount", 'amount'),
+        Column("Payment Status", 'payment_status', choice_label(Payment, 'payment_status')),
+        Column("Payment Method", 'payment_method', choice_label(Payment, 'payment_method')),
+        Column("Transaction ID", 'transaction_id'),
+        Column("Payment Date", 'payment_date'),
+        Column("Remark", 'remark'),
+    ], 'payments', title="Payments")
 
 # Mise à jour d'un paiement
 @csrf_exempt
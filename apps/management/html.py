@@ -1,25 +1,27 @@
 import os
 import json
 from datetime import datetime
-from collections import defaultdict
-from openpyxl import Workbook
+from decimal import Decimal
 
 from django.conf import settings
 from django.contrib import messages
 from django.utils import timezone
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
-from django.db.models import Q,Sum
+from django.db.models import Q,Sum,Prefetch,F,OuterRef,Subquery,Value,CharField,DecimalField
+from django.db.models.functions import Cast,Coalesce,Concat
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from .models import Building, Breed, Batch, Feed, Treatment, DailyLog, Feeding, EggCollection, TreatmentHistory, Provision, ExpenseCategory, Expense,StockLoss
+from .models import Building, Breed, Batch, Feed, Treatment, DailyLog, Feeding, EggCollection, TreatmentHistory, Provision, ExpenseCategory, Expense,StockLoss,ExpensePayment,FeedStockLedger
 from apps.ventes.models import BatchAllocation,OrderItem
+from .pagination import DateBucketPaginator
 from .forms import BuildingForm, BreedForm, BatchForm, FeedForm, TreatmentForm, DailyLogForm, FeedingForm, EggCollectionForm, TreatmentHistoryForm, ProvisionForm, ExpenseCategoryForm, ExpenseForm,StockLossForm
 from apps.users.models import Fournisseur
 from apps.profile.models import CompanyProfile
 from apps.users.decorators import role_required
+from apps.users.exports import export_response, Column, file_url
 
 login_path = '/accounts/login'
 
@@ -78,26 +80,13 @@ def building_list_export(request):
     else:
         buildings = Building.objects.all().order_by('id')
 
-    # Créer un nouveau classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Buildings"
-
-    # Ajouter les en-têtes
-    ws.append(["ID", "Name", "Capacity", "Details", "Photo URL"])
-
-    # Ajouter les données des bâtiments
-    for building in buildings:
-        ws.append([building.id, building.name, building.capacity, building.details, (settings.SITE_URL + building.photo.url) if building.photo else ""])
-
-    # Créer une réponse HTTP avec le fichier Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=buildings.xlsx'
-
-    # Enregistrer le classeur dans la réponse
-    wb.save(response)
-
-    return response
+    return export_response(request, buildings, [
+        Column("ID", 'id'),
+        Column("Name", 'name'),
+        Column("Capacity", 'capacity'),
+        Column("Details", 'details'),
+        Column("Photo URL", 'photo', file_url(absolute=True)),
+    ], 'buildings', title="Buildings")
 
 @csrf_exempt
 @login_required(login_url=login_path)
@@ -232,26 +221,12 @@ def breed_list_export(request):
     else:
         breeds = Breed.objects.all().order_by('id')
 
-    # Créer un nouveau classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Breeds"
-
-    # Ajouter les en-têtes
-    ws.append(["ID", "Name", "Details", "Photo URL"])
-
-    # Ajouter les données des races
-    for breed in breeds:
-        ws.append([breed.id, breed.name, breed.details, (settings.SITE_URL + breed.photo.url) if breed.photo else ""])
-
-    # Créer une réponse HTTP avec le fichier Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=breeds.xlsx'
-
-    # Enregistrer le classeur dans la réponse
-    wb.save(response)
-
-    return response
+    return export_response(request, breeds, [
+        Column("ID", 'id'),
+        Column("Name", 'name'),
+        Column("Details", 'details'),
+        Column("Photo URL", 'photo', file_url(absolute=True)),
+    ], 'breeds', title="Breeds")
 
 @csrf_exempt
 @login_required(login_url=login_path)
@@ -488,26 +463,12 @@ def feed_list_export(request):
     else:
         feeds = Feed.objects.all().order_by('id')
 
-    # Créer un nouveau classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Feeds"
-
-    # Ajouter les en-têtes
-    ws.append(["Name", "Details", "Unit Price", "Unit Measure"])
-
-    # Ajouter les données des aliments
-    for feed in feeds:
-        ws.append([feed.name, feed.details, feed.unit_price, feed.unit_measure])
-
-    # Créer une réponse HTTP avec le fichier Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=feeds.xlsx'
-
-    # Enregistrer le classeur dans la réponse
-    wb.save(response)
-
-    return response
+    return export_response(request, feeds, [
+        Column("Name", 'name'),
+        Column("Details", 'details'),
+        Column("Unit Price", 'unit_price'),
+        Column("Unit Measure", 'unit_measure'),
+    ], 'feeds', title="Feeds")
 
 @csrf_exempt
 @login_required(login_url=login_path)
@@ -616,26 +577,11 @@ def treatment_list_export(request):
     else:
         treatments = Treatment.objects.all().order_by('id')
 
-    # Créer un nouveau classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Treatments"
-
-    # Ajouter les en-têtes
-    ws.append(["Name", "Details", "Duration Days"])
-
-    # Ajouter les données des traitements
-    for treatment in treatments:
-        ws.append([treatment.name, treatment.details, treatment.duration_days])
-
-    # Créer une réponse HTTP avec le fichier Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=treatments.xlsx'
-
-    # Enregistrer le classeur dans la réponse
-    wb.save(response)
-
-    return response
+    return export_response(request, treatments, [
+        Column("Name", 'name'),
+        Column("Details", 'details'),
+        Column("Duration Days", 'duration_days'),
+    ], 'treatments', title="Treatments")
 
 @csrf_exempt
 @login_required(login_url=login_path)
@@ -711,14 +657,8 @@ def daily_log_list(request, batch_id):
             daily_logs = DailyLog.objects.none()
             messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
 
-    grouped_logs = defaultdict(list)
-    for daily_log in daily_logs:
-        if daily_log.log_date:
-            log_date_str = daily_log.log_date.strftime('%Y-%m-%d')
-            daily_log.log_date = daily_log.log_date.strftime('%Y-%m-%d')
-            grouped_logs[log_date_str].append(daily_log)
-
-    paginator = Paginator(list(grouped_logs.items()), 6)
+    # Six dates par page, paginées en base
+    paginator = DateBucketPaginator(daily_logs, 'log_date', 6)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -796,29 +736,15 @@ def daily_log_list_export(request, batch_id):
     query = request.GET.get('q')
     if query:
         daily_logs = daily_logs.filter(Q(details__icontains=query)).distinct().order_by('id')
-    else:
-        daily_logs = daily_logs
-
-    # Créer un nouveau classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "DailyLogs"
-
-    # Ajouter les en-têtes
-    ws.append(["Date", "Batch", "Living Quantity", "Deceased Quantity", "Sick Quantity", "Details"])
-
-    # Ajouter les données des journaux quotidiens
-    for log in daily_logs:
-        ws.append([log.log_date, log.batch.name, log.living_quantity, log.deceased_quantity, log.sick_quantity, log.details])
 
-    # Créer une réponse HTTP avec le fichier Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=DailyLogs.xlsx'
-
-    # Enregistrer le classeur dans la réponse
-    wb.save(response)
-
-    return response
+    return export_response(request, daily_logs, [
+        Column("Date", 'log_date'),
+        Column("Batch", 'batch__name'),
+        Column("Living Quantity", 'living_quantity'),
+        Column("Deceased Quantity", 'deceased_quantity'),
+        Column("Sick Quantity", 'sick_quantity'),
+        Column("Details", 'details'),
+    ], 'DailyLogs')
 
 
 
@@ -951,14 +877,7 @@ def feeding_list(request, batch_id):
             feedings = Feeding.objects.none()
             messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
 
-    grouped_feedings = defaultdict(list)
-    for feeding in feedings:
-        if feeding.feeding_date:
-            feeding_date_str = feeding.feeding_date.strftime('%Y-%m-%d')
-            feeding.feeding_date = feeding_date_str
-            grouped_feedings[feeding_date_str].append(feeding)
-
-    paginator = Paginator(list(grouped_feedings.items()), 6)
+    paginator = DateBucketPaginator(feedings, 'feeding_date', 6)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -970,11 +889,7 @@ def feeding_list(request, batch_id):
 
             # Vérification des stocks disponibles pour le feed utilisé
             feed = feeding.feed_type
-            total_provisions = Provision.objects.filter(feed=feed).aggregate(total=Sum('quantity'))['total'] or 0
-            total_losses = StockLoss.objects.filter(feed=feed).aggregate(total=Sum('quantity'))['total'] or 0
-            total_used = Feeding.objects.filter(feed_type=feed).aggregate(total=Sum('quantity'))['total'] or 0
-
-            available_stock = total_provisions - (total_used + total_losses)
+            available_stock = feeding.get_available_stock()  # Solde courant du registre de stock
             if feeding.quantity > available_stock:
                 messages.error(
                     request,
@@ -1033,29 +948,24 @@ def feeding_list_export(request, batch_id):
     query = request.GET.get('q')
     if query:
         feedings = feedings.filter(Q(feeding_date__icontains=query)).distinct().order_by('id')
-    else:
-        feedings = feedings
-
-    # Créer un nouveau classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Feedings"
-
-    # Ajouter les en-têtes
-    ws.append(["Date", "Batch", "Quantity", "Feed Type","Feed Stock Before","Feed Stock After", "Details"])
-
-    # Ajouter les données des alimentations
-    for feeding in feedings:
-        ws.append([feeding.feeding_date, feeding.batch.name, feeding.quantity, feeding.feed_type.name,feeding.feed_quantity_before,feed_quantity_after, feeding.details])
-
-    # Créer une réponse HTTP avec le fichier Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=Feedings.xlsx'
 
-    # Enregistrer le classeur dans la réponse
-    wb.save(response)
-
-    return response
+    # Stock avant l'alimentation lu dans le registre de stock, comme Feeding.feed_quantity_before
+    stock_entry = FeedStockLedger.objects.filter(
+        source=FeedStockLedger.FEEDING, source_id=OuterRef('pk'), quantity__lt=0
+    ).order_by('-id')
+    feedings = feedings.annotate(
+        stock_before=Subquery(stock_entry.annotate(before=F('balance') - F('quantity')).values('before')[:1])
+    ).annotate(stock_after=F('stock_before') - F('quantity'))
+
+    return export_response(request, feedings, [
+        Column("Date", 'feeding_date'),
+        Column("Batch", 'batch__name'),
+        Column("Quantity", 'quantity'),
+        Column("Feed Type", 'feed_type__name'),
+        Column("Feed Stock Before", 'stock_before'),
+        Column("Feed Stock After", 'stock_after'),
+        Column("Details", 'details'),
+    ], 'Feedings')
 
 @csrf_exempt
 @login_required(login_url=login_path)
@@ -1084,11 +994,7 @@ def update_feeding(request, id):
 
         # Vérification des stocks disponibles pour le feed utilisé
         feed = feeding.feed_type
-        total_provisions = Provision.objects.filter(feed=feed).aggregate(total=Sum('quantity'))['total'] or 0
-        total_losses = StockLoss.objects.filter(feed=feed).aggregate(total=Sum('quantity'))['total'] or 0
-        total_used = Feeding.objects.filter(feed_type=feed).exclude(id=feeding.id).aggregate(total=Sum('quantity'))['total'] or 0
-
-        available_stock = total_provisions - (total_used + total_losses)
+        available_stock = feeding.get_available_stock()  # Hors quantité déjà enregistrée pour cette alimentation
         if feeding.quantity > available_stock:
             messages.error(
                 request,
@@ -1180,19 +1086,8 @@ def egg_collection_list(request, batch_id):
         except ValueError:
             egg_collections = EggCollection.objects.none()
 
-    # Regrouper les collections par date
-    grouped_collections = defaultdict(list)
-    for egg_collection in egg_collections:
-        if egg_collection.collection_date:
-            collection_date_str = egg_collection.collection_date.strftime('%Y-%m-%d')
-            grouped_collections[collection_date_str].append(egg_collection)
-
-    for egg_collection in egg_collections:
-        if egg_collection.collection_date:
-            egg_collection.collection_date = egg_collection.collection_date.strftime('%Y-%m-%d')
-
-    # Paginer les groupes de collections
-    paginator = Paginator(list(grouped_collections.items()), 6)  # Show 6 groups per page
+    # Paginer les collections regroupées par date
+    paginator = DateBucketPaginator(egg_collections, 'collection_date', 6)  # Show 6 groups per page
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -1239,26 +1134,14 @@ def egg_collection_list_export(request, batch_id):
     query = request.GET.get('q')
     if query:
         egg_collections = egg_collections.filter(Q(details__icontains=query)).distinct().order_by('id')
-    else:
-        egg_collections = egg_collections
-
-    # Créer un nouveau classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Egg Collections"
-    # Ajouter les en-têtes
-    ws.append(["Date", "Batch", "Quantity", "Cracked", "Details"])
-    # Ajouter les données des collections
-    for egg_collection in egg_collections:
-        ws.append([egg_collection.collection_date, egg_collection.batch.name, egg_collection.quantity, egg_collection.craked, egg_collection.details])
-
-    # Créer une réponse HTTP avec le fichier Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=EggCollections.xlsx'
-    # Enregistrer le classeur dans la réponse
-    wb.save(response)
 
-    return response
+    return export_response(request, egg_collections, [
+        Column("Date", 'collection_date'),
+        Column("Batch", 'batch__name'),
+        Column("Quantity", 'quantity'),
+        Column("Cracked", 'craked'),
+        Column("Details", 'details'),
+    ], 'EggCollections', title="Egg Collections")
 
 @csrf_exempt
 @login_required(login_url=login_path)
@@ -1329,14 +1212,7 @@ def treatment_history_list(request, batch_id):
             messages.error(request, "Invalid search format. Please use a valid date or date range.")
             treatment_histories = TreatmentHistory.objects.none()
 
-    grouped_histories = defaultdict(list)
-    for history in treatment_histories:
-        if history.treatment_date:
-            treatment_date_str = history.treatment_date.strftime('%Y-%m-%d')
-            history.treatment_date = history.treatment_date.strftime('%Y-%m-%d')
-            grouped_histories[treatment_date_str].append(history)
-
-    paginator = Paginator(list(grouped_histories.items()), 6)
+    paginator = DateBucketPaginator(treatment_histories, 'treatment_date', 6)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -1403,29 +1279,13 @@ def treatment_history_list_export(request, batch_id):
     query = request.GET.get('q')
     if query:
         treatment_histories = treatment_histories.filter(Q(treatment__name__icontains=query)).distinct().order_by('id')
-    else:
-        treatment_histories = treatment_histories
-
-    # Créer un nouveau classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "TreatmentHistories"
-
-    # Ajouter les en-têtes
-    ws.append(["Date", "Batch", "Treatment", "Details"])
-
-    # Ajouter les données des traitements
-    for history in treatment_histories:
-        ws.append([history.treatment_date, history.batch.name, history.treatment.name, history.details])
-
-    # Créer une réponse HTTP avec le fichier Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=TreatmentHistories.xlsx'
-
-    # Enregistrer le classeur dans la réponse
-    wb.save(response)
 
-    return response
+    return export_response(request, treatment_histories, [
+        Column("Date", 'treatment_date'),
+        Column("Batch", 'batch__name'),
+        Column("Treatment", 'treatment__name'),
+        Column("Details", 'details'),
+    ], 'TreatmentHistories')
 
 @csrf_exempt
 @login_required(login_url=login_path)
@@ -1553,26 +1413,14 @@ def provision_list_export(request):
     else:
         provisions = Provision.objects.all().order_by('id')
 
-    # Créer un nouveau classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Provisions"
-
-    # Ajouter les en-têtes
-    ws.append(["ID", "Supplier", "Feed", "Quantity", "Provision Date", "Details"])
-
-    # Ajouter les données des provisions
-    for provision in provisions:
-        ws.append([provision.id, provision.supplier.name, provision.feed.name, provision.quantity, provision.provision_date, provision.details])
-
-    # Créer une réponse HTTP avec le fichier Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=provisions.xlsx'
-
-    # Enregistrer le classeur dans la réponse
-    wb.save(response)
-
-    return response
+    return export_response(request, provisions, [
+        Column("ID", 'id'),
+        Column("Supplier", 'supplier__name'),
+        Column("Feed", 'feed__name'),
+        Column("Quantity", 'quantity'),
+        Column("Provision Date", 'provision_date'),
+        Column("Details", 'details'),
+    ], 'provisions', title="Provisions")
 
 @csrf_exempt
 @login_required(login_url=login_path)
@@ -1704,18 +1552,13 @@ def stock_loss_export(request):
     if query:
         losses = losses.filter(Q(loss_date__icontains=query)).distinct().order_by('id')
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Stock Losses"
-    ws.append(["Date", "Feed", "Quantity", "Reason", "Details"])
-
-    for loss in losses:
-        ws.append([loss.loss_date, loss.feed.name, loss.quantity, loss.reason, loss.details])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=StockLosses.xlsx'
-    wb.save(response)
-    return response
+    return export_response(request, losses, [
+        Column("Date", 'loss_date'),
+        Column("Feed", 'feed__name'),
+        Column("Quantity", 'quantity'),
+        Column("Reason", 'reason'),
+        Column("Details", 'details'),
+    ], 'StockLosses', title="Stock Losses")
 
 @login_required(login_url=login_path)
 def update_stock_loss(request, id):
@@ -1811,26 +1654,10 @@ def expense_category_list_export(request):
     else:
         categories = ExpenseCategory.objects.all().order_by('id')
 
-    # Créer un nouveau classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Expense Categories"
-
-    # Ajouter les en-têtes
-    ws.append(["ID", "Name"])
-
-    # Ajouter les données des catégories
-    for category in categories:
-        ws.append([category.id, category.name])
-
-    # Créer une réponse HTTP avec le fichier Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=expense_categories.xlsx'
-
-    # Enregistrer le classeur dans la réponse
-    wb.save(response)
-
-    return response
+    return export_response(request, categories, [
+        Column("ID", 'id'),
+        Column("Name", 'name'),
+    ], 'expense_categories', title="Expense Categories")
 
 @csrf_exempt
 @login_required(login_url=login_path)
@@ -1940,30 +1767,27 @@ def expense_list_print(request):
 def expense_list_export(request):
     query = request.GET.get('q')
     if query:
-        expenses = Expense.objects.filter(Q(description__icontains=query) | Q(category__name__icontains=query)).distinct().order_by('id')
+        expenses = Expense.objects.filter(Q(details__icontains=query) | Q(category__name__icontains=query)).distinct().order_by('id')
     else:
         expenses = Expense.objects.all().order_by('id')
 
-    # Créer un nouveau classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Expenses"
-
-    # Ajouter les en-têtes
-    ws.append(["ID", "Category", "Supplier", "Batch", "Description", "Amount", "Paid Amount", "Expense Date", "Debt Amount"])
-
-    # Ajouter les données des charges
-    for expense in expenses:
-        ws.append([expense.id, expense.category.name, expense.supplier.name if expense.supplier else "", expense.batch.name if expense.batch else "", expense.description, expense.amount, expense.paid_amount, expense.expense_date, expense.debt_amount])
-
-    # Créer une réponse HTTP avec le fichier Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=expenses.xlsx'
-
-    # Enregistrer le classeur dans la réponse
-    wb.save(response)
-
-    return response
+    # Montant payé et reste dû calculés en base à partir des paiements de la charge
+    paid = ExpensePayment.objects.filter(expense=OuterRef('pk')).order_by().values('expense').annotate(total=Sum('amount')).values('total')
+    expenses = expenses.annotate(
+        paid_amount=Coalesce(Subquery(paid), Value(Decimal('0.00')), output_field=DecimalField(max_digits=12, decimal_places=2))
+    ).annotate(debt_amount=F('amount') - F('paid_amount'))
+
+    return export_response(request, expenses, [
+        Column("ID", 'id'),
+        Column("Category", 'category__name'),
+        Column("Supplier", 'supplier__name', lambda name: name or ""),
+        Column("Batch", 'batch__name', lambda name: name or ""),
+        Column("Description", 'details'),
+        Column("Amount", 'amount'),
+        Column("Paid Amount", 'paid_amount'),
+        Column("Expense Date", 'expense_date'),
+        Column("Debt Amount", 'debt_amount'),
+    ], 'expenses', title="Expenses")
 
 @csrf_exempt
 @login_required(login_url=login_path)
@@ -2125,25 +1949,21 @@ def batch_allocation_list_export(request, batch_id):
     allocations = BatchAllocation.objects.filter(batch_id=batch_id).order_by('id')
     query = request.GET.get('q')
     if query:
-        allocations = allocations.filter(Q(order_item__order__order_date__icontains=query)).distinct().order_by('id')
-    else:
-        allocations = allocations
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "BatchAllocations"
-
-    ws.append(["Order Item", "Batch", "Quantity Eggs", "Quantity Poultry"])
-
-    for allocation in allocations:
-        ws.append([allocation.order_item, allocation.batch.name, allocation.quantity_eggs, allocation.quantity_poultry])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=BatchAllocations.xlsx'
-
-    wb.save(response)
-
-    return response
+        allocations = allocations.filter(Q(order_item__order__created_at__icontains=query)).distinct().order_by('id')
+
+    # Libellé de l'article de commande composé en base, comme OrderItem.__str__
+    allocations = allocations.annotate(order_item_label=Concat(
+        'order_item__product_unit__name', Value(' (x'), Cast('order_item__quantity', CharField()),
+        Value(') - Order '), Cast('order_item__order_id', CharField()),
+        output_field=CharField(),
+    ))
+
+    return export_response(request, allocations, [
+        Column("Order Item", 'order_item_label'),
+        Column("Batch", 'batch__name'),
+        Column("Quantity Eggs", 'quantity_eggs'),
+        Column("Quantity Poultry", 'quantity_poultry'),
+    ], 'BatchAllocations')
 
 @login_required(login_url='login_path')
 @role_required(excluded_roles=['customer','cashier','veterinarian','employee','farmer']) 
@@ -2220,7 +2040,16 @@ def batch_statistics_view(request):
     if building_id:
         query &= Q(building_id=building_id)
 
-    batches = Batch.objects.filter(query)
+    # Totaux annotés en sous-requêtes et relations préchargées : nombre de requêtes constant
+    batches = (
+        Batch.objects.filter(query)
+        .select_related('breed', 'building')
+        .prefetch_related(Prefetch('feeding_set', queryset=Feeding.objects.select_related('feed_type')))
+        .with_statistics()
+    )
+
+    # Rentabilité mensuelle de tous les lots en deux requêtes groupées
+    monthly_profitability = batches.monthly_profitability()
 
     # Préparer les données à renvoyer
     data = []
@@ -2249,7 +2078,7 @@ def batch_statistics_view(request):
             'mortality_rate': batch.get_mortality_rate(),
             'laying_rate': batch.get_laying_rate(),
             'nutrition_data': batch.get_nutrition_data(),
-            'monthly_profitability': batch.calculate_monthly_profitability(),
+            'monthly_profitability': monthly_profitability[batch.id],
         }
         data.append(batch_data)
 
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from kake.tenant_manager import each_tenant
+
+from apps.management.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit les totaux journaliers des lots (BatchDailyRollup) à partir des "
+        "journaux, collectes, alimentations, dépenses et allocations, pour chaque tenant."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_names', nargs='*', help="Schémas des tenants à traiter (défaut : tous).")
+        parser.add_argument(
+            '--batch', type=int, action='append', dest='batch_ids',
+            help="Identifiant d'un lot à reconstruire (option répétable).",
+        )
+
+    def handle(self, *args, **options):
+        filters = {'schema_name__in': options['schema_names']} if options['schema_names'] else {}
+        for tenant in each_tenant(**filters):
+            count = rebuild_rollups(options['batch_ids'])
+            self.stdout.write(f"{tenant.schema_name} : {count} journée(s) de lot reconstruite(s)")
+        self.stdout.write(self.style.SUCCESS("Totaux journaliers reconstruits."))
@@ -0,0 +1,97 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:05
+
+import django.db.models.deletion
+from collections import defaultdict
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, FloatField, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def build_rollups(apps, schema_editor):
+    """
+    Calcule les totaux journaliers de l'historique existant, avec une requête
+    groupée par (lot, date) pour chaque table source.
+    """
+    DailyLog = apps.get_model('management', 'DailyLog')
+    EggCollection = apps.get_model('management', 'EggCollection')
+    Feeding = apps.get_model('management', 'Feeding')
+    Expense = apps.get_model('management', 'Expense')
+    BatchAllocation = apps.get_model('ventes', 'BatchAllocation')
+    BatchDailyRollup = apps.get_model('management', 'BatchDailyRollup')
+
+    sources = (
+        (DailyLog, 'log_date', {
+            'deceased': Sum('deceased_quantity'),
+            'sick': Sum('sick_quantity'),
+        }),
+        (EggCollection, 'collection_date', {
+            'eggs': Sum('quantity'),
+            'cracked': Sum('craked'),
+        }),
+        (Feeding, 'feeding_date', {
+            'feed_quantity': Sum('quantity'),
+            'feed_cost': Sum(F('quantity') * F('feed_type__unit_price'), output_field=FloatField()),
+        }),
+        (Expense, 'expense_date', {
+            'expenses': Sum('amount'),
+        }),
+        (BatchAllocation, 'order_item__order__created_at__date', {
+            'revenue': Sum(
+                (Coalesce('quantity_eggs', Value(0)) + Coalesce('quantity_poultry', Value(0)))
+                * F('order_item__product_unit__price'),
+                output_field=FloatField(),
+            ),
+        }),
+    )
+
+    rollups = defaultdict(dict)
+    for model, date_path, aggregates in sources:
+        rows = (
+            model.objects.filter(batch__isnull=False)
+            .annotate(day=F(date_path))
+            .order_by()
+            .values('batch_id', 'day')
+            .annotate(**aggregates)
+        )
+        for row in rows:
+            values = rollups[(row['batch_id'], row['day'])]
+            for name in aggregates:
+                if row[name] is not None:
+                    values[name] = row[name]
+
+    BatchDailyRollup.objects.bulk_create(
+        [BatchDailyRollup(batch_id=batch_id, date=day, **values) for (batch_id, day), values in rollups.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0002_initial'),
+        ('ventes', '0002_alter_coupon_valid_from_alter_coupon_valid_to'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('eggs', models.IntegerField(default=0)),
+                ('cracked', models.IntegerField(default=0)),
+                ('deceased', models.IntegerField(default=0)),
+                ('sick', models.IntegerField(default=0)),
+                ('feed_quantity', models.FloatField(default=0)),
+                ('feed_cost', models.FloatField(default=0)),
+                ('expenses', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('revenue', models.FloatField(default=0)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='management.batch')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('batch', 'date'), name='unique_batch_daily_rollup')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
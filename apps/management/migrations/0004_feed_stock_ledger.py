@@ -0,0 +1,76 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:40
+
+import django.db.models.deletion
+from collections import defaultdict
+from django.db import migrations, models
+
+
+def build_ledger(apps, schema_editor):
+    """
+    Reprend l'historique existant dans le registre : mouvements triés par date
+    (provisions d'abord), solde courant calculé au fil de l'eau.
+    """
+    Feed = apps.get_model('management', 'Feed')
+    Provision = apps.get_model('management', 'Provision')
+    Feeding = apps.get_model('management', 'Feeding')
+    StockLoss = apps.get_model('management', 'StockLoss')
+    FeedStock = apps.get_model('management', 'FeedStock')
+    FeedStockLedger = apps.get_model('management', 'FeedStockLedger')
+
+    movements = defaultdict(list)
+    for order, (model, feed_field, date_field, sign, source) in enumerate((
+        (Provision, 'feed_id', 'provision_date', 1, 'provision'),
+        (Feeding, 'feed_type_id', 'feeding_date', -1, 'feeding'),
+        (StockLoss, 'feed_id', 'loss_date', -1, 'loss'),
+    )):
+        for pk, feed_id, day, quantity in model.objects.values_list('pk', feed_field, date_field, 'quantity').iterator():
+            movements[feed_id].append((day, order, pk, sign * quantity, source))
+
+    entries, stocks = [], []
+    for feed_id in Feed.objects.values_list('pk', flat=True):
+        balance = 0
+        for day, order, pk, quantity, source in sorted(movements.get(feed_id, [])):
+            balance += quantity
+            entries.append(FeedStockLedger(
+                feed_id=feed_id, entry_date=day, quantity=quantity,
+                balance=balance, source=source, source_id=pk,
+            ))
+        stocks.append(FeedStock(feed_id=feed_id, balance=balance))
+
+    FeedStockLedger.objects.bulk_create(entries, batch_size=1000)
+    FeedStock.objects.bulk_create(stocks, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0003_batchdailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedStock',
+            fields=[
+                ('feed', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock', serialize=False, to='management.feed')),
+                ('balance', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FeedStockLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_date', models.DateField()),
+                ('quantity', models.FloatField()),
+                ('balance', models.FloatField()),
+                ('source', models.CharField(choices=[('provision', 'Provision'), ('feeding', 'Feeding'), ('loss', 'Stock loss')], max_length=20)),
+                ('source_id', models.BigIntegerField()),
+                ('recorded_at', models.DateTimeField(auto_now_add=True)),
+                ('feed', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='management.feed')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['feed', 'entry_date'], name='feed_ledger_date_idx'), models.Index(fields=['source', 'source_id'], name='feed_ledger_source_idx')],
+            },
+        ),
+        migrations.RunPython(build_ledger, migrations.RunPython.noop),
+    ]
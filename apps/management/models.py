@@ -3,10 +3,13 @@ from decimal import Decimal
 from datetime import datetime,timedelta
 
 
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from django.db.models import Sum,F
+from django.db.models import Sum,F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, TruncMonth
 from apps.users.models import User, Fournisseur
 from django.utils.timezone import now
 from django.utils import timezone
@@ -41,6 +44,152 @@ class Breed(models.Model):
         return self.name
 
 
+class BatchQuerySet(models.QuerySet):
+    def with_statistics(self):
+        """
+        Annote chaque lot avec ses totaux (décès, malades, œufs, allocations,
+        revenus, dépenses) calculés par sous-requêtes : le nombre de requêtes ne
+        dépend plus du nombre de lots. Les décès, œufs et dépenses sont lus dans
+        les totaux journaliers (BatchDailyRollup), une ligne par jour d'activité.
+        Les méthodes de Batch utilisent ces annotations lorsqu'elles sont présentes.
+        """
+        from apps.ventes.models import BatchAllocation
+
+        def total(queryset, expression, default=0, output_field=None):
+            output_field = output_field or models.IntegerField()
+            subquery = (
+                queryset.filter(batch=OuterRef('pk'))
+                .order_by()
+                .values('batch')
+                .annotate(total=Sum(expression, output_field=output_field))
+                .values('total')
+            )
+            return Coalesce(Subquery(subquery, output_field=output_field), Value(default), output_field=output_field)
+
+        revenue = models.FloatField()
+        latest_log = DailyLog.objects.filter(batch=OuterRef('pk')).order_by('-log_date')
+
+        return self.annotate(
+            deceased_total=total(BatchDailyRollup.objects.all(), 'deceased'),
+            sick_latest=Coalesce(Subquery(latest_log.values('sick_quantity')[:1]), Value(0)),
+            eggs_total=total(BatchDailyRollup.objects.all(), 'eggs'),
+            allocated_eggs=total(BatchAllocation.objects.all(), 'quantity_eggs'),
+            allocated_poultry=total(BatchAllocation.objects.all(), 'quantity_poultry'),
+            eggs_revenue=total(
+                BatchAllocation.objects.filter(quantity_eggs__isnull=False),
+                F('quantity_eggs') * F('order_item__product_unit__price'),
+                0.0, revenue,
+            ),
+            poultry_revenue=total(
+                BatchAllocation.objects.filter(quantity_poultry__isnull=False),
+                F('quantity_poultry') * F('order_item__product_unit__price'),
+                0.0, revenue,
+            ),
+            expenses_total=total(
+                BatchDailyRollup.objects.all(), 'expenses',
+                Decimal('0.00'), models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+    def monthly_profitability(self, end_date=None):
+        """
+        Rentabilité mensuelle de chaque lot du queryset ({id du lot: [mois...]}),
+        en deux requêtes groupées au lieu de trois par lot et par mois. Un
+        queryset déjà évalué n'est pas relu.
+        """
+        return batches_monthly_profitability({batch.pk: batch.arrival_date for batch in self}, end_date)
+
+    def revenues(self):
+        """
+        Revenus (œufs et poules) de chaque lot du queryset : {id du lot: {'eggs', 'poultry'}}.
+        """
+        return batches_revenue([batch.pk for batch in self])
+
+
+# Revenus par lot mis en cache (clé propre au tenant, voir kake.cache.make_key)
+REVENUE_CACHE_KEY = "batch-revenue:{}"
+
+
+def batches_revenue(batch_ids):
+    """
+    Retourne {id du lot: {'eggs': revenu, 'poultry': revenu}}. Les lots absents
+    du cache sont calculés en une seule requête groupée (Sum(quantité * prix)),
+    puis mis en cache jusqu'à la prochaine modification de leurs allocations.
+    """
+    from apps.ventes.models import BatchAllocation
+
+    keys = {batch_id: REVENUE_CACHE_KEY.format(batch_id) for batch_id in batch_ids}
+    cached = cache.get_many(list(keys.values()))
+    revenues = {batch_id: cached[key] for batch_id, key in keys.items() if key in cached}
+
+    missing = [batch_id for batch_id in keys if batch_id not in revenues]
+    if missing:
+        price = F('order_item__product_unit__price')
+        computed = {batch_id: {'eggs': 0, 'poultry': 0} for batch_id in missing}
+        rows = (
+            BatchAllocation.objects.filter(batch_id__in=missing)
+            .order_by()
+            .values('batch_id')
+            .annotate(
+                eggs=Sum(F('quantity_eggs') * price, output_field=models.FloatField()),
+                poultry=Sum(F('quantity_poultry') * price, output_field=models.FloatField()),
+            )
+        )
+        for row in rows:
+            computed[row['batch_id']] = {'eggs': row['eggs'] or 0, 'poultry': row['poultry'] or 0}
+        cache.set_many(
+            {keys[batch_id]: value for batch_id, value in computed.items()},
+            getattr(settings, 'BATCH_REVENUE_CACHE_TTL', 3600),
+        )
+        revenues.update(computed)
+    return revenues
+
+
+def invalidate_batch_revenue(batch_ids):
+    cache.delete_many([REVENUE_CACHE_KEY.format(batch_id) for batch_id in batch_ids if batch_id is not None])
+
+
+def batches_monthly_profitability(arrivals, end_date=None):
+    """
+    Calcule la rentabilité mensuelle des lots `arrivals` ({id du lot: date
+    d'arrivée}) : revenus et dépenses des totaux journaliers regroupés par
+    mois (TruncMonth) en une requête, puis complétés en une série continue
+    jusqu'à `end_date`.
+    """
+    end_date = end_date or timezone.now().date()
+    if not arrivals:
+        return {}
+
+    revenues, expenses = {}, {}
+    rows = (
+        BatchDailyRollup.objects.filter(batch_id__in=arrivals)
+        .annotate(month=TruncMonth('date'))
+        .order_by()
+        .values('batch_id', 'month')
+        .annotate(revenue=Sum('revenue'), expenses=Sum('expenses'))
+    )
+    for row in rows:
+        revenues[(row['batch_id'], row['month'])] = row['revenue'] or 0
+        expenses[(row['batch_id'], row['month'])] = row['expenses'] or 0
+
+    profitability = {}
+    for batch_id, arrival_date in arrivals.items():
+        months = []
+        month_start = arrival_date.replace(day=1)
+        while arrival_date <= end_date and month_start <= end_date:
+            total_revenue = revenues.get((batch_id, month_start), 0)
+            total_expenses = expenses.get((batch_id, month_start), 0)
+            months.append({
+                'month': month_start.strftime('%Y-%m'),
+                'total_revenue': total_revenue,
+                'total_expenses': total_expenses,
+                'profitability': total_revenue - float(total_expenses),
+            })
+            month_start = (month_start + timedelta(days=32)).replace(day=1)
+        profitability[batch_id] = months
+    return profitability
+
+
 class Batch(models.Model):
     # Constants
     STATUS_CHOICES = [
@@ -59,6 +208,8 @@ class Batch(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     details = models.TextField(blank=True, null=True)
 
+    objects = BatchQuerySet.as_manager()
+
     # String representation
     def __str__(self):
         return self.name
@@ -129,14 +280,18 @@ class Batch(models.Model):
         """
         Retourne le nombre total de poules décédées.
         """
-        return self.dailylog_set.aggregate(
-            total_deceased=models.Sum('deceased_quantity')
+        if hasattr(self, 'deceased_total'):  # Lot chargé par with_statistics()
+            return self.deceased_total
+        return self.daily_rollups.aggregate(
+            total_deceased=models.Sum('deceased')
         )['total_deceased'] or 0
 
     def get_sick_quantity(self):
         """
         Retourne le nombre de poules malades en se basant sur le dernier log quotidien.
         """
+        if hasattr(self, 'sick_latest'):
+            return self.sick_latest
         last_log = self.dailylog_set.order_by('-log_date').first()
         return last_log.sick_quantity if last_log else 0
 
@@ -150,6 +305,9 @@ class Batch(models.Model):
         """
         Calcule le nombre actuel de poules disponibles en tenant compte des allocations.
         """
+        if hasattr(self, 'allocated_poultry'):
+            return self.get_current_poultry() - self.allocated_poultry
+
         allocated_poultry = self.batch_allocations.aggregate(
             total_allocated=models.Sum('quantity_poultry')
         )['total_allocated'] or 0
@@ -160,14 +318,19 @@ class Batch(models.Model):
         """
         Retourne le total des œufs collectés pour ce lot.
         """
-        return self.eggcollection_set.aggregate(
-            total_eggs=models.Sum('quantity')
+        if hasattr(self, 'eggs_total'):
+            return self.eggs_total
+        return self.daily_rollups.aggregate(
+            total_eggs=models.Sum('eggs')
         )['total_eggs'] or 0
 
     def get_available_eggs(self):
         """
         Retourne le nombre d'œufs disponibles en tenant compte des allocations.
         """
+        if hasattr(self, 'allocated_eggs'):
+            return self.get_total_eggs_collected() - self.allocated_eggs
+
         allocated_eggs = self.batch_allocations.aggregate(
             total_allocated=models.Sum('quantity_eggs')
         )['total_allocated'] or 0
@@ -179,21 +342,17 @@ class Batch(models.Model):
         """
         Retourne le revenu total généré par les œufs dans ce lot.
         """
-        allocations = self.batch_allocations.filter(quantity_eggs__isnull=False)
-        return sum(
-            allocation.quantity_eggs * allocation.order_item.product_unit.price
-            for allocation in allocations
-        )
+        if hasattr(self, 'eggs_revenue'):
+            return self.eggs_revenue
+        return batches_revenue([self.pk])[self.pk]['eggs']
 
     def get_revenue_from_poultry(self):
         """
         Retourne le revenu total généré par les poules dans ce lot.
         """
-        allocations = self.batch_allocations.filter(quantity_poultry__isnull=False)
-        return sum(
-            allocation.quantity_poultry * allocation.order_item.product_unit.price
-            for allocation in allocations
-        )
+        if hasattr(self, 'poultry_revenue'):
+            return self.poultry_revenue
+        return batches_revenue([self.pk])[self.pk]['poultry']
 
     def get_total_revenue(self):
         """
@@ -206,8 +365,10 @@ class Batch(models.Model):
         """
         Calcule le total des dépenses associées à ce batch.
         """
-        return self.expense_set.aggregate(
-            total=models.Sum('amount')
+        if hasattr(self, 'expenses_total'):
+            return self.expenses_total
+        return self.daily_rollups.aggregate(
+            total=models.Sum('expenses')
         )['total'] or 0
 
     # Rentabilité
@@ -256,62 +417,40 @@ class Batch(models.Model):
             for log in nutrition_logs
         ]
 
+    def get_daily_rollups(self, start_date=None, end_date=None):
+        """
+        Retourne les totaux journaliers du lot (BatchDailyRollup) sur la période,
+        lus par un seul parcours de l'index (lot, date).
+        """
+        rollups = self.daily_rollups.all()
+        if start_date:
+            rollups = rollups.filter(date__gte=start_date)
+        if end_date:
+            rollups = rollups.filter(date__lte=end_date)
+        return rollups.order_by('date')
+
 
     def calculate_monthly_profitability(self):
         """
         Calcule la rentabilité par mois en soustrayant les dépenses des revenus mensuels.
+        Pour plusieurs lots, utiliser Batch.objects.monthly_profitability().
         """
-        monthly_profitability = []
-        current_date = self.arrival_date
-        end_date = timezone.now().date()
-
-        while current_date <= end_date:
-            month_start = current_date.replace(day=1)
-            month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-
-            total_revenue = self.get_total_revenue_for_period(month_start, month_end)
-            total_expenses = self.get_total_expenses_for_period(month_start, month_end)
-            profitability = total_revenue - total_expenses
-
-            monthly_profitability.append({
-                'month': month_start.strftime('%Y-%m'),
-                'total_revenue': total_revenue,
-                'total_expenses': total_expenses,
-                'profitability': profitability
-            })
-
-            current_date = month_end + timedelta(days=1)
-
-        return monthly_profitability
+        return batches_monthly_profitability({self.pk: self.arrival_date})[self.pk]
 
     def get_total_revenue_for_period(self, start_date, end_date):
         """
         Calcule le revenu total pour une période donnée.
         """
-        egg_revenue = self.batch_allocations.filter(
-            quantity_eggs__isnull=False,
-            order_item__order__created_at__range=(start_date, end_date)
-        ).aggregate(
-            total=Sum(F('quantity_eggs') * F('order_item__product_unit__price'))
-        )['total'] or 0
-
-        poultry_revenue = self.batch_allocations.filter(
-            quantity_poultry__isnull=False,
-            order_item__order__created_at__range=(start_date, end_date)
-        ).aggregate(
-            total=Sum(F('quantity_poultry') * F('order_item__product_unit__price'))
+        return self.get_daily_rollups(start_date, end_date).aggregate(
+            total=Sum('revenue')
         )['total'] or 0
 
-        return egg_revenue + poultry_revenue
-
     def get_total_expenses_for_period(self, start_date, end_date):
         """
         Calcule le total des dépenses pour une période donnée.
         """
-        return self.expense_set.filter(
-            expense_date__range=(start_date, end_date)
-        ).aggregate(
-            total=Sum('amount')
+        return self.get_daily_rollups(start_date, end_date).aggregate(
+            total=Sum('expenses')
         )['total'] or 0
     
 
@@ -384,41 +523,32 @@ class Feeding(models.Model):
             raise ValidationError({'quantity': 'Quantity must be greater than zero.'})
 
         # Vérification du stock disponible
-        if self.feed_quantity_before < self.quantity:
+        available_stock = self.get_available_stock()
+        if available_stock < self.quantity:
             raise ValidationError({
-                'quantity': f'Insufficient stock for {self.feed_type.name}. Available: {self.feed_quantity_before:.2f}, required: {self.quantity:.2f}'
+                'quantity': f'Insufficient stock for {self.feed_type.name}. Available: {available_stock:.2f}, required: {self.quantity:.2f}'
             })
 
+    def get_available_stock(self):
+        """
+        Stock actuel de l'aliment, sans compter la quantité déjà enregistrée
+        pour cette alimentation (modification).
+        """
+        return FeedStock.available(self.feed_type_id, FeedStockLedger.FEEDING, self.pk)
+
     @property
     def feed_quantity_before(self):
         """
-        Calcule le stock disponible avant cette alimentation.
-        - Total des provisions ajoutées pour ce type d'aliment.
-        - Moins les quantités utilisées dans les feedings précédents.
-        - Moins les pertes enregistrées (StockLoss).
+        Stock de l'aliment juste avant cette alimentation, lu dans le registre
+        de stock (FeedStockLedger) ; stock actuel si elle n'est pas enregistrée.
         """
-        total_provisions = Provision.objects.filter(feed=self.feed_type).aggregate(
-            total=Sum('quantity')
-        )['total'] or 0
-
-        used_feedings = Feeding.objects.filter(
-            feed_type=self.feed_type,
-            feeding_date__lt=self.feeding_date
-        ).aggregate(total=Sum('quantity'))['total'] or 0
-
-        # Inclure les feedings du même jour, dans l'ordre
-        same_day_feedings = Feeding.objects.filter(
-            feed_type=self.feed_type,
-            feeding_date=self.feeding_date
-        ).exclude(id=self.id).order_by('id')
-
-        
-
-        total_losses = StockLoss.objects.filter(feed=self.feed_type).aggregate(
-            total=Sum('quantity')
-        )['total'] or 0
-
-        return total_provisions - (used_feedings + total_losses)
+        if self.pk is not None:
+            entry = FeedStockLedger.objects.filter(
+                source=FeedStockLedger.FEEDING, source_id=self.pk, quantity__lt=0
+            ).order_by('-id').first()
+            if entry is not None:
+                return entry.balance - entry.quantity
+        return FeedStock.available(self.feed_type_id)
 
     @property
     def feed_quantity_after(self):
@@ -505,12 +635,104 @@ class StockLoss(models.Model):
             })
 
     def calculate_available_stock(self):
-        """Calculate the available stock for the given feed."""
-        total_provisions = Provision.objects.filter(feed=self.feed).aggregate(total=Sum('quantity'))['total'] or 0
-        total_used = Feeding.objects.filter(feed_type=self.feed).aggregate(total=Sum('quantity'))['total'] or 0
-        total_losses = StockLoss.objects.filter(feed=self.feed).exclude(id=self.id).aggregate(total=Sum('quantity'))['total'] or 0
+        """Calculate the available stock for the given feed, excluding this loss."""
+        return FeedStock.available(self.feed_id, FeedStockLedger.LOSS, self.pk)
+
+
+class FeedStock(models.Model):
+    """
+    Solde courant d'un aliment, mis à jour sous verrou (select_for_update) à
+    chaque écriture dans le registre FeedStockLedger.
+    """
+    feed = models.OneToOneField(Feed, on_delete=models.CASCADE, primary_key=True, related_name='stock')
+    balance = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
-        return total_provisions - (total_used + total_losses)
+    def __str__(self):
+        return f"Stock of {self.feed.name}: {self.balance}"
+
+    @classmethod
+    def available(cls, feed_id, source=None, source_id=None):
+        """
+        Retourne le stock actuel de l'aliment. Avec `source` et `source_id`,
+        la quantité déjà enregistrée pour cette saisie est réintégrée.
+        """
+        if feed_id is None:
+            return 0
+        balance = cls.objects.filter(feed_id=feed_id).values_list('balance', flat=True).first() or 0
+        if source_id is not None:
+            balance -= FeedStockLedger.objects.filter(
+                feed_id=feed_id, source=source, source_id=source_id
+            ).aggregate(total=Sum('quantity'))['total'] or 0
+        return balance
+
+    @classmethod
+    def record(cls, feed_id, entry_date, quantity, source, source_id):
+        """
+        Ajoute un mouvement au registre et met à jour le solde de l'aliment
+        dans la même transaction.
+        """
+        with transaction.atomic():
+            stock, _ = cls.objects.select_for_update().get_or_create(feed_id=feed_id)
+            stock.balance += quantity
+            stock.save(update_fields=['balance', 'updated_at'])
+            return FeedStockLedger.objects.create(
+                feed_id=feed_id,
+                entry_date=entry_date,
+                quantity=quantity,
+                balance=stock.balance,
+                source=source,
+                source_id=source_id,
+            )
+
+
+class FeedStockLedger(models.Model):
+    """
+    Registre des mouvements de stock d'aliment, en ajout seul : une saisie
+    modifiée ou supprimée est compensée par un mouvement inverse. `balance`
+    est le solde de l'aliment après le mouvement.
+    """
+    PROVISION = 'provision'
+    FEEDING = 'feeding'
+    LOSS = 'loss'
+    SOURCE_CHOICES = [
+        (PROVISION, 'Provision'),
+        (FEEDING, 'Feeding'),
+        (LOSS, 'Stock loss'),
+    ]
+
+    feed = models.ForeignKey(Feed, on_delete=models.CASCADE, related_name='ledger_entries')
+    entry_date = models.DateField()
+    quantity = models.FloatField()  # Positif pour une provision, négatif pour une alimentation ou une perte
+    balance = models.FloatField()
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    source_id = models.BigIntegerField()
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['feed', 'entry_date'], name='feed_ledger_date_idx'),
+            models.Index(fields=['source', 'source_id'], name='feed_ledger_source_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} {self.quantity} of {self.feed.name} on {self.entry_date}"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValidationError("Feed stock ledger entries cannot be modified.")
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def stock_on(cls, feed_id, day):
+        """
+        Stock de l'aliment à la fin du jour `day` : solde actuel moins les
+        mouvements datés après ce jour (parcours de l'index (aliment, date)).
+        """
+        later = cls.objects.filter(feed_id=feed_id, entry_date__gt=day).aggregate(
+            total=Sum('quantity')
+        )['total'] or 0
+        return FeedStock.available(feed_id) - later
 
 class ExpenseCategory(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -537,3 +759,29 @@ class ExpensePayment(models.Model):
 
     def __str__(self):
         return f"Payment of {self.amount} for expense {self.expense}"
+
+
+class BatchDailyRollup(models.Model):
+    """
+    Totaux d'un lot pour une journée, tenus à jour par les signaux des
+    journaux, collectes, alimentations, dépenses et allocations
+    (voir apps.management.rollups). Reconstruits par `rebuild_rollups`.
+    """
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()
+    eggs = models.IntegerField(default=0)
+    cracked = models.IntegerField(default=0)
+    deceased = models.IntegerField(default=0)
+    sick = models.IntegerField(default=0)
+    feed_quantity = models.FloatField(default=0)
+    feed_cost = models.FloatField(default=0)
+    expenses = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    revenue = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['batch', 'date'], name='unique_batch_daily_rollup'),
+        ]
+
+    def __str__(self):
+        return f"Rollup for {self.batch.name} on {self.date}"
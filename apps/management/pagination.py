@@ -0,0 +1,33 @@
+from collections import defaultdict
+
+from django.core.paginator import Paginator
+
+
+class DateBucketPaginator(Paginator):
+    """
+    Pagine des lignes regroupées par date. Les dates distinctes sont paginées
+    en SQL, puis seules les lignes des dates de la page sont lues : le coût
+    d'une page ne dépend pas de la longueur de l'historique.
+
+    Chaque élément d'une page est un couple (date 'AAAA-MM-JJ', [lignes]),
+    les lignes gardant l'ordre du queryset.
+    """
+
+    def __init__(self, queryset, date_field, per_page, **kwargs):
+        self.queryset = queryset
+        self.date_field = date_field
+        dates = (
+            queryset.filter(**{f'{date_field}__isnull': False})
+            .order_by(date_field)
+            .values_list(date_field, flat=True)
+            .distinct()
+        )
+        super().__init__(dates, per_page, **kwargs)
+
+    def _get_page(self, dates, number, paginator):
+        dates = list(dates)
+        rows = defaultdict(list)
+        for row in self.queryset.filter(**{f'{self.date_field}__in': dates}):
+            rows[getattr(row, self.date_field)].append(row)
+        buckets = [(day.strftime('%Y-%m-%d'), rows[day]) for day in dates]
+        return super()._get_page(buckets, number, paginator)
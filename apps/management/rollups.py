@@ -0,0 +1,162 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum, F, FloatField, Value
+from django.db.models.functions import Coalesce
+
+from .models import Batch, BatchDailyRollup, DailyLog, EggCollection, Feeding, Expense
+
+# Valeurs d'une journée sans aucune saisie
+EMPTY_ROLLUP = {
+    'eggs': 0,
+    'cracked': 0,
+    'deceased': 0,
+    'sick': 0,
+    'feed_quantity': 0.0,
+    'feed_cost': 0.0,
+    'expenses': Decimal('0.00'),
+    'revenue': 0.0,
+}
+
+
+def get_rollup_sources():
+    """
+    Modèles alimentant BatchDailyRollup : (modèle, chemin de la date, agrégats).
+    Le revenu d'une allocation compte le jour de création de sa commande, au
+    prix actuel du produit (comme Batch.get_total_revenue) : un changement de
+    prix d'aliment ou d'unité de vente reconstruit les lots concernés.
+    """
+    from apps.ventes.models import BatchAllocation
+
+    return [
+        (DailyLog, 'log_date', {
+            'deceased': Sum('deceased_quantity'),
+            'sick': Sum('sick_quantity'),
+        }),
+        (EggCollection, 'collection_date', {
+            'eggs': Sum('quantity'),
+            'cracked': Sum('craked'),
+        }),
+        (Feeding, 'feeding_date', {
+            'feed_quantity': Sum('quantity'),
+            'feed_cost': Sum(F('quantity') * F('feed_type__unit_price'), output_field=FloatField()),
+        }),
+        (Expense, 'expense_date', {
+            'expenses': Sum('amount'),
+        }),
+        (BatchAllocation, 'order_item__order__created_at__date', {
+            'revenue': Sum(
+                (Coalesce('quantity_eggs', Value(0)) + Coalesce('quantity_poultry', Value(0)))
+                * F('order_item__product_unit__price'),
+                output_field=FloatField(),
+            ),
+        }),
+    ]
+
+
+def get_rollup_source(model):
+    for source in get_rollup_sources():
+        if source[0] is model:
+            return source
+    return None
+
+
+def collect_rollups(batch_ids=None, day=None):
+    """
+    Calcule les totaux par (lot, date) à partir des tables sources, avec une
+    requête groupée par source. Filtrable par lots et par jour.
+    """
+    rollups = defaultdict(lambda: dict(EMPTY_ROLLUP))
+    for model, date_path, aggregates in get_rollup_sources():
+        queryset = model.objects.filter(batch__isnull=False)
+        if batch_ids is not None:
+            queryset = queryset.filter(batch_id__in=batch_ids)
+        if day is not None:
+            queryset = queryset.filter(**{date_path: day})
+        rows = queryset.annotate(day=F(date_path)).order_by().values('batch_id', 'day').annotate(**aggregates)
+        for row in rows:
+            values = rollups[(row['batch_id'], row['day'])]
+            for name in aggregates:
+                values[name] = row[name] or EMPTY_ROLLUP[name]
+    return rollups
+
+
+def rollup_keys(model, pk):
+    """
+    Retourne les (lot, date) concernés par la ligne `pk` du modèle source,
+    lus en base (la date d'une allocation est celle de sa commande).
+    """
+    source = get_rollup_source(model)
+    if source is None or pk is None:
+        return set()
+    row = model.objects.filter(pk=pk, batch__isnull=False).values_list('batch_id', source[1]).first()
+    return {row} if row else set()
+
+
+def lock_batches(batch_ids=None):
+    """
+    Verrouille les lots (SELECT ... FOR UPDATE) jusqu'à la fin de la transaction :
+    les calculs concurrents des totaux d'un même lot sont sérialisés. Retourne
+    les identifiants des lots encore présents.
+    """
+    batches = Batch.objects.select_for_update().order_by('pk')
+    if batch_ids is not None:
+        batches = batches.filter(pk__in=batch_ids)
+    return set(batches.values_list('pk', flat=True))
+
+
+def refresh_rollups(keys, model=None):
+    """
+    Recalcule les lignes de BatchDailyRollup des (lot, date) donnés ; une
+    journée sans plus aucune saisie est supprimée. Avec `model`, seules les
+    colonnes alimentées par ce modèle source sont recalculées.
+
+    Le lot est verrouillé pendant le calcul : deux saisies simultanées sur la
+    même journée ne peuvent pas écrire chacune un total qui ignore l'autre.
+    """
+    sources = [get_rollup_source(model)] if model is not None else get_rollup_sources()
+    for batch_id, day in keys:
+        if batch_id is None or day is None:
+            continue
+        with transaction.atomic():
+            if not lock_batches([batch_id]):
+                continue  # Lot supprimé : ses totaux disparaissent avec lui
+
+            values = {}
+            for source_model, date_path, aggregates in sources:
+                row = source_model.objects.filter(batch_id=batch_id, **{date_path: day}).aggregate(**aggregates)
+                values.update({name: row[name] or EMPTY_ROLLUP[name] for name in aggregates})
+
+            rollup = BatchDailyRollup.objects.filter(batch_id=batch_id, date=day).first()
+            if rollup is None:
+                if values != {name: EMPTY_ROLLUP[name] for name in values}:
+                    BatchDailyRollup.objects.create(batch_id=batch_id, date=day, **{**EMPTY_ROLLUP, **values})
+                continue
+
+            for name, value in values.items():
+                setattr(rollup, name, value)
+            if all(getattr(rollup, name) == empty for name, empty in EMPTY_ROLLUP.items()):
+                rollup.delete()
+            else:
+                rollup.save(update_fields=list(values))
+
+
+def rebuild_rollups(batch_ids=None, batch_size=1000):
+    """
+    Reconstruit entièrement les totaux journaliers (tous les lots ou ceux
+    donnés). Retourne le nombre de lignes créées.
+    """
+    with transaction.atomic():
+        lock_batches(batch_ids)
+        existing = BatchDailyRollup.objects.all()
+        if batch_ids is not None:
+            existing = existing.filter(batch_id__in=batch_ids)
+        existing.delete()
+
+        rollups = [
+            BatchDailyRollup(batch_id=batch_id, date=day, **values)
+            for (batch_id, day), values in collect_rollups(batch_ids).items()
+        ]
+        BatchDailyRollup.objects.bulk_create(rollups, batch_size=batch_size)
+    return len(rollups)
@@ -0,0 +1,151 @@
+import datetime
+
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from apps.ventes.models import BatchAllocation
+
+from .models import (
+    Batch, DailyLog, EggCollection, Feeding, Expense, Feed, Provision, StockLoss, FeedStock, FeedStockLedger,
+    invalidate_batch_revenue,
+)
+from .rollups import rollup_keys, refresh_rollups, rebuild_rollups
+
+# Modèles dont les saisies alimentent BatchDailyRollup
+ROLLUP_SENDERS = (DailyLog, EggCollection, Feeding, Expense, BatchAllocation)
+
+
+# Prix lus par BatchDailyRollup au moment du calcul : modèle -> champ du prix
+PRICE_FIELDS = {
+    'management.Feed': 'unit_price',
+    'produits.ProductUnit': 'price',
+}
+
+
+# Mouvements de stock d'aliment : modèle -> (champ aliment, champ date, signe, source du registre)
+STOCK_MOVEMENTS = {
+    Provision: ('feed_id', 'provision_date', 1, FeedStockLedger.PROVISION),
+    Feeding: ('feed_type_id', 'feeding_date', -1, FeedStockLedger.FEEDING),
+    StockLoss: ('feed_id', 'loss_date', -1, FeedStockLedger.LOSS),
+}
+
+
+def deleted_with(origin, model):
+    # Suppression en cascade depuis `model` : les lignes dérivées disparaissent avec lui
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin_model is model
+
+
+def remember_rollup_keys(sender, instance, **kwargs):
+    # (lot, date) avant modification : une saisie déplacée met à jour les deux journées
+    instance._rollup_keys = rollup_keys(sender, instance.pk)
+
+
+def update_rollups_on_save(sender, instance, raw=False, **kwargs):
+    if raw:  # Chargement de fixtures : reconstruire avec rebuild_rollups
+        return
+    keys = getattr(instance, '_rollup_keys', set()) | rollup_keys(sender, instance.pk)
+    refresh_rollups(keys, sender)
+
+
+def update_rollups_on_delete(sender, instance, origin=None, **kwargs):
+    if origin is not None and deleted_with(origin, Batch):
+        return
+    refresh_rollups(getattr(instance, '_rollup_keys', set()), sender)
+
+
+for sender in ROLLUP_SENDERS:
+    receiver(pre_save, sender=sender)(remember_rollup_keys)
+    receiver(post_save, sender=sender)(update_rollups_on_save)
+    receiver(pre_delete, sender=sender)(remember_rollup_keys)
+    receiver(post_delete, sender=sender)(update_rollups_on_delete)
+
+
+def stock_movement(instance):
+    feed_field, date_field, sign, source = STOCK_MOVEMENTS[type(instance)]
+    day = getattr(instance, date_field)
+    if isinstance(day, datetime.datetime):  # Valeur par défaut timezone.now avant enregistrement
+        day = day.date()
+    return getattr(instance, feed_field), day, sign * instance.quantity
+
+
+def remember_stock_movement(sender, instance, raw=False, **kwargs):
+    previous = sender.objects.filter(pk=instance.pk).first() if instance.pk is not None and not raw else None
+    instance._stock_movement = stock_movement(previous) if previous is not None else None
+
+
+def record_stock_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    source = STOCK_MOVEMENTS[sender][3]
+    previous = getattr(instance, '_stock_movement', None)
+    current = stock_movement(instance)
+    if previous == current:
+        return
+    if previous is not None:
+        # Registre en ajout seul : l'ancienne saisie est compensée puis la nouvelle enregistrée
+        feed_id, day, quantity = previous
+        FeedStock.record(feed_id, day, -quantity, source, instance.pk)
+    FeedStock.record(*current, source, instance.pk)
+
+
+def record_stock_on_delete(sender, instance, origin=None, **kwargs):
+    if origin is not None and deleted_with(origin, Feed):
+        return
+    feed_id, day, quantity = stock_movement(instance)
+    FeedStock.record(feed_id, day, -quantity, STOCK_MOVEMENTS[sender][3], instance.pk)
+
+
+for sender in STOCK_MOVEMENTS:
+    receiver(pre_save, sender=sender)(remember_stock_movement)
+    receiver(post_save, sender=sender)(record_stock_on_save)
+    receiver(post_delete, sender=sender)(record_stock_on_delete)
+
+
+@receiver(post_save, sender=BatchAllocation)
+@receiver(post_delete, sender=BatchAllocation)
+def invalidate_allocation_revenue(sender, instance, **kwargs):
+    # Lot de l'allocation et, si elle a changé de lot, le précédent (lu par remember_rollup_keys)
+    previous = {batch_id for batch_id, _ in getattr(instance, '_rollup_keys', set())}
+    invalidate_batch_revenue({instance.batch_id} | previous)
+
+
+def remember_price(sender, instance, raw=False, **kwargs):
+    field = PRICE_FIELDS[sender._meta.label]
+    previous = None
+    if instance.pk is not None and not raw:
+        previous = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+    instance._previous_price = previous
+
+
+def price_changed(sender, instance, created, raw):
+    if created or raw:
+        return False
+    return getattr(instance, '_previous_price', None) != getattr(instance, PRICE_FIELDS[sender._meta.label])
+
+
+for sender in PRICE_FIELDS:
+    receiver(pre_save, sender=sender)(remember_price)
+
+
+@receiver(post_save, sender=Feed)
+def update_rollups_on_feed_price(sender, instance, created=False, raw=False, **kwargs):
+    # Coût d'alimentation des totaux journaliers : lots nourris avec cet aliment
+    if price_changed(sender, instance, created, raw):
+        batch_ids = set(Feeding.objects.filter(feed_type=instance).values_list('batch_id', flat=True))
+        if batch_ids:
+            rebuild_rollups(batch_ids)
+
+
+@receiver(post_save, sender='produits.ProductUnit')
+def invalidate_product_unit_revenue(sender, instance, created=False, raw=False, **kwargs):
+    # Le revenu est calculé au prix actuel de l'unité vendue
+    if created:
+        return
+    batch_ids = set(
+        BatchAllocation.objects.filter(order_item__product_unit=instance)
+        .values_list('batch_id', flat=True)
+    )
+    invalidate_batch_revenue(batch_ids)
+    if batch_ids and price_changed(sender, instance, created, raw):
+        rebuild_rollups(batch_ids)
@@ -0,0 +1,287 @@
+import datetime
+import importlib
+from decimal import Decimal
+
+from django.apps import apps
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.produits.models import Category, Product, ProductUnit
+from apps.users.models import Fournisseur
+from apps.ventes.models import Order, OrderItem, BatchAllocation
+
+from .models import (
+    Batch, Breed, Building, DailyLog, EggCollection, Expense, ExpenseCategory, Feed, Feeding,
+    Provision, StockLoss, FeedStock, FeedStockLedger, BatchDailyRollup, batches_revenue,
+)
+from .rollups import collect_rollups, rebuild_rollups
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+DAY = datetime.date(2026, 8, 1)
+NEXT_DAY = datetime.date(2026, 8, 2)
+
+
+def run_migration_function(module, function):
+    # Les fonctions RunPython n'utilisent que des champs inchangés depuis : le registre courant suffit
+    return getattr(importlib.import_module(f'apps.management.migrations.{module}'), function)(apps, None)
+
+
+class ManagementTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = Batch.objects.create(
+            breed=Breed.objects.create(name='Breed'),
+            building=Building.objects.create(name='Building', capacity=1000),
+            arrival_date=datetime.date(2026, 7, 1),
+            arrival_quantity=100,
+        )
+        cls.supplier = Fournisseur.objects.create(name='Supplier')
+        cls.feed = Feed.objects.create(name='Feed', unit_price=Decimal('2.00'))
+        cls.other_feed = Feed.objects.create(name='Other feed', unit_price=Decimal('5.00'))
+
+    def provision(self, feed, quantity, day=DAY):
+        return Provision.objects.create(supplier=self.supplier, feed=feed, quantity=quantity, provision_date=day)
+
+    def feeding(self, quantity, feed=None, day=DAY):
+        return Feeding.objects.create(batch=self.batch, feed_type=feed or self.feed, quantity=quantity, feeding_date=day)
+
+    def balance(self, feed):
+        return FeedStock.available(feed.pk)
+
+    def ledger_total(self, feed):
+        return sum(FeedStockLedger.objects.filter(feed=feed).values_list('quantity', flat=True))
+
+    def rollup(self, day=DAY):
+        return BatchDailyRollup.objects.filter(batch=self.batch, date=day).first()
+
+    def sell(self, price, quantity_eggs=None, quantity_poultry=None):
+        if quantity_eggs:
+            # Les œufs vendus doivent avoir été collectés
+            EggCollection.objects.create(batch=self.batch, collection_date=DAY, quantity=quantity_eggs)
+        product = Product.objects.create(name='Eggs', category=Category.objects.create(name='Category'))
+        unit = ProductUnit.objects.create(product=product, name='Tray', quantity=30, price=price)
+        item = OrderItem.objects.create(order=Order.objects.create(), product_unit=unit, quantity=1)
+        allocation = BatchAllocation.objects.create(
+            order_item=item, batch=self.batch, quantity_eggs=quantity_eggs, quantity_poultry=quantity_poultry,
+        )
+        return unit, allocation
+
+
+class FeedStockLedgerTests(ManagementTestCase):
+
+    def test_provision_save_update_delete(self):
+        provision = self.provision(self.feed, 100)
+        self.assertEqual(self.balance(self.feed), 100)
+
+        provision.quantity = 80
+        provision.save()
+        self.assertEqual(self.balance(self.feed), 80)
+        self.assertEqual(FeedStockLedger.objects.filter(source_id=provision.pk).count(), 3)
+
+        provision.delete()
+        self.assertEqual(self.balance(self.feed), 0)
+        self.assertEqual(self.ledger_total(self.feed), 0)
+
+    def test_feeding_save_update_delete(self):
+        self.provision(self.feed, 100)
+        feeding = self.feeding(30)
+        self.assertEqual(self.balance(self.feed), 70)
+        self.assertEqual(feeding.feed_quantity_before, 100)
+
+        feeding.quantity = 50
+        feeding.save()
+        self.assertEqual(self.balance(self.feed), 50)
+        # La quantité déjà enregistrée pour cette alimentation reste disponible pour elle
+        self.assertEqual(feeding.get_available_stock(), 100)
+
+        feeding.delete()
+        self.assertEqual(self.balance(self.feed), 100)
+
+    def test_feeding_cannot_exceed_stock(self):
+        from django.core.exceptions import ValidationError
+
+        self.provision(self.feed, 10)
+        with self.assertRaises(ValidationError):
+            self.feeding(20)
+        self.assertEqual(self.balance(self.feed), 10)
+
+    def test_feeding_moved_to_another_feed(self):
+        self.provision(self.feed, 100)
+        self.provision(self.other_feed, 100)
+        feeding = self.feeding(30)
+
+        feeding.feed_type = self.other_feed
+        feeding.save()
+        self.assertEqual(self.balance(self.feed), 100)
+        self.assertEqual(self.balance(self.other_feed), 70)
+        self.assertEqual(self.ledger_total(self.feed), self.balance(self.feed))
+        self.assertEqual(self.ledger_total(self.other_feed), self.balance(self.other_feed))
+
+    def test_stock_loss_save_update_delete(self):
+        self.provision(self.feed, 100)
+        loss = StockLoss.objects.create(feed=self.feed, quantity=10, loss_date=DAY)
+        self.assertEqual(self.balance(self.feed), 90)
+
+        loss.quantity = 25
+        loss.save()
+        self.assertEqual(self.balance(self.feed), 75)
+
+        loss.delete()
+        self.assertEqual(self.balance(self.feed), 100)
+
+    def test_stock_on(self):
+        self.provision(self.feed, 100, DAY)
+        self.feeding(30, day=NEXT_DAY)
+        self.assertEqual(FeedStockLedger.stock_on(self.feed.pk, DAY), 100)
+        self.assertEqual(FeedStockLedger.stock_on(self.feed.pk, NEXT_DAY), 70)
+
+    def test_ledger_backfill(self):
+        self.provision(self.feed, 100, DAY)
+        self.provision(self.other_feed, 40, NEXT_DAY)
+        self.feeding(30, day=NEXT_DAY)
+        StockLoss.objects.create(feed=self.feed, quantity=5, loss_date=NEXT_DAY)
+        expected = {feed.pk: self.balance(feed) for feed in (self.feed, self.other_feed)}
+
+        FeedStockLedger.objects.all().delete()
+        FeedStock.objects.all().delete()
+        run_migration_function('0004_feed_stock_ledger', 'build_ledger')
+
+        self.assertEqual({feed.pk: self.balance(feed) for feed in (self.feed, self.other_feed)}, expected)
+        # Provisions d'abord, puis alimentations et pertes : solde courant jamais négatif
+        balances = FeedStockLedger.objects.filter(feed=self.feed).order_by('pk').values_list('balance', flat=True)
+        self.assertEqual(list(balances), [100, 70, 65])
+
+
+class BatchDailyRollupTests(ManagementTestCase):
+
+    def assertRollupsMatchSources(self):
+        stored = {
+            (rollup.batch_id, rollup.date): rollup
+            for rollup in BatchDailyRollup.objects.all()
+        }
+        expected = collect_rollups()
+        self.assertEqual(set(stored), set(expected))
+        for key, values in expected.items():
+            for name, value in values.items():
+                self.assertEqual(getattr(stored[key], name), value, f"{key} {name}")
+
+    def test_daily_log_save_update_delete(self):
+        log = DailyLog.objects.create(batch=self.batch, log_date=DAY, deceased_quantity=2, sick_quantity=1)
+        self.assertEqual(self.rollup().deceased, 2)
+
+        log.deceased_quantity = 5
+        log.save()
+        self.assertEqual(self.rollup().deceased, 5)
+
+        log.delete()
+        self.assertIsNone(self.rollup())
+
+    def test_egg_collection_moved_to_another_day(self):
+        collection = EggCollection.objects.create(batch=self.batch, collection_date=DAY, quantity=50, craked=3)
+        collection.collection_date = NEXT_DAY
+        collection.save()
+
+        self.assertIsNone(self.rollup(DAY))
+        self.assertEqual((self.rollup(NEXT_DAY).eggs, self.rollup(NEXT_DAY).cracked), (50, 3))
+        self.assertRollupsMatchSources()
+
+    def test_sources_share_the_daily_row(self):
+        DailyLog.objects.create(batch=self.batch, log_date=DAY, deceased_quantity=2)
+        collection = EggCollection.objects.create(batch=self.batch, collection_date=DAY, quantity=50)
+        collection.delete()
+
+        # Les colonnes du journal quotidien restent, la ligne n'est pas supprimée
+        self.assertEqual((self.rollup().deceased, self.rollup().eggs), (2, 0))
+        self.assertRollupsMatchSources()
+
+    def test_feeding_cost_and_feed_price_change(self):
+        self.provision(self.feed, 100)
+        self.provision(self.other_feed, 100)
+        feeding = self.feeding(10)
+        self.assertEqual((self.rollup().feed_quantity, self.rollup().feed_cost), (10, 20))
+
+        feeding.feed_type = self.other_feed
+        feeding.save()
+        self.assertEqual(self.rollup().feed_cost, 50)
+
+        self.other_feed.unit_price = Decimal('3.00')
+        self.other_feed.save()
+        self.assertEqual(self.rollup().feed_cost, 30)
+        self.assertRollupsMatchSources()
+
+    def test_expense_save_update_delete(self):
+        today = timezone.now().date()
+        category = ExpenseCategory.objects.create(name='Category')
+        expense = Expense.objects.create(category=category, batch=self.batch, amount=Decimal('12.50'))
+        self.assertEqual(self.rollup(today).expenses, Decimal('12.50'))
+
+        expense.amount = Decimal('20.00')
+        expense.save()
+        self.assertEqual(self.rollup(today).expenses, Decimal('20.00'))
+
+        expense.delete()
+        self.assertIsNone(self.rollup(today))
+
+    def test_allocation_revenue_and_price_change(self):
+        today = timezone.now().date()
+        unit, allocation = self.sell(2.5, quantity_eggs=30)
+        self.assertEqual(self.rollup(today).revenue, 75)
+
+        unit.price = 5
+        unit.save()
+        self.assertEqual(self.rollup(today).revenue, 150)
+
+        allocation.delete()
+        self.assertIsNone(self.rollup(today))
+
+    def test_batch_statistics_read_rollups(self):
+        DailyLog.objects.create(batch=self.batch, log_date=DAY, deceased_quantity=4)
+        EggCollection.objects.create(batch=self.batch, collection_date=NEXT_DAY, quantity=60)
+        batch = Batch.objects.with_statistics().get(pk=self.batch.pk)
+
+        self.assertEqual((batch.get_deceased_quantity(), batch.get_total_eggs_collected()), (4, 60))
+        self.assertEqual((self.batch.get_deceased_quantity(), self.batch.get_total_eggs_collected()), (4, 60))
+
+    def test_rebuild_and_backfill(self):
+        self.provision(self.feed, 100)
+        self.feeding(10)
+        DailyLog.objects.create(batch=self.batch, log_date=DAY, deceased_quantity=1)
+        EggCollection.objects.create(batch=self.batch, collection_date=NEXT_DAY, quantity=40)
+        self.sell(2.5, quantity_poultry=2)
+
+        self.assertEqual(rebuild_rollups(), 3)
+        self.assertRollupsMatchSources()
+
+        BatchDailyRollup.objects.all().delete()
+        run_migration_function('0003_batchdailyrollup', 'build_rollups')
+        self.assertRollupsMatchSources()
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BatchRevenueCacheTests(ManagementTestCase):
+
+    def test_revenue_is_cached(self):
+        self.sell(2.5, quantity_eggs=30)
+        self.assertEqual(batches_revenue([self.batch.pk])[self.batch.pk], {'eggs': 75, 'poultry': 0})
+        with self.assertNumQueries(0):
+            self.assertEqual(batches_revenue([self.batch.pk])[self.batch.pk]['eggs'], 75)
+
+    def test_allocation_changes_invalidate(self):
+        _, allocation = self.sell(2.5, quantity_eggs=30)
+        self.assertEqual(batches_revenue([self.batch.pk])[self.batch.pk]['eggs'], 75)
+
+        self.sell(2.5, quantity_eggs=10)
+        self.assertEqual(batches_revenue([self.batch.pk])[self.batch.pk]['eggs'], 100)
+
+        allocation.delete()
+        self.assertEqual(batches_revenue([self.batch.pk])[self.batch.pk]['eggs'], 25)
+
+    def test_price_change_invalidates(self):
+        unit, _ = self.sell(2.5, quantity_poultry=2)
+        batches_revenue([self.batch.pk])
+
+        unit.price = 10
+        unit.save()
+        self.assertEqual(batches_revenue([self.batch.pk])[self.batch.pk]['poultry'], 20)
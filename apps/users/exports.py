@@ -0,0 +1,156 @@
+import asyncio
+import contextvars
+import csv
+import datetime
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+
+from kake.tenant_manager import set_search_path, get_current_schema, get_current_database
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+
+# Lignes lues par aller-retour avec la base (curseur côté serveur sous PostgreSQL)
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Column:
+    """
+    Colonne d'export : en-tête, chemin lu par values_list (les relations
+    comme 'batch__name' deviennent des jointures) et transformation
+    optionnelle de la valeur.
+    """
+
+    def __init__(self, header, field, transform=None):
+        self.header = header
+        self.field = field
+        self.transform = transform
+
+    def value(self, raw):
+        return self.transform(raw) if self.transform else raw
+
+
+def choice_label(model, field_name):
+    """Transformation qui affiche le libellé d'un champ à choix (comme get_FOO_display)."""
+    labels = dict(model._meta.get_field(field_name).flatchoices)
+    return lambda value: labels.get(value, value)
+
+
+def file_url(absolute=False):
+    """Transformation qui convertit le nom d'un fichier stocké en URL."""
+    def transform(name):
+        if not name:
+            return ""
+        url = default_storage.url(name)
+        return settings.SITE_URL + url if absolute else url
+    return transform
+
+
+def export_rows(queryset, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Génère les lignes de l'export sans instancier de modèles : values_list
+    parcouru par blocs de `chunk_size`. La clé primaire est toujours lue,
+    pour qu'un queryset distinct() ne fusionne pas deux lignes identiques.
+    """
+    fields = ['pk'] + [column.field for column in columns]
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        yield [column.value(raw) for column, raw in zip(columns, row[1:])]
+
+
+def excel_value(value):
+    # Excel ne gère ni les fuseaux horaires ni les UUID
+    if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+class Echo:
+    """Pseudo-fichier pour csv.writer : chaque ligne écrite est renvoyée telle quelle."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, headers):
+    writer = csv.writer(Echo())
+    yield '\ufeff'  # BOM : Excel ouvre le fichier en UTF-8
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+async def async_chunks(lines, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Parcourt `lines` par blocs dans un thread dédié à l'export : sous ASGI,
+    Django chargerait entièrement en mémoire un itérateur synchrone avant de
+    l'envoyer. Le thread ouvre sa propre connexion, placée sur le schéma du
+    tenant de la requête et fermée en fin d'envoi : le curseur côté serveur
+    n'est jamais partagé avec les vues des autres requêtes.
+    """
+    # Tenant, base et schéma de la requête, lus par le routeur dans le thread de l'export
+    context = contextvars.copy_context()
+    executor = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+
+    def run(function):
+        return loop.run_in_executor(executor, context.run, function)
+
+    def activate():
+        set_search_path(get_current_schema(), connections[get_current_database()])
+
+    try:
+        await run(activate)
+        while chunk := await run(lambda: "".join(islice(lines, chunk_size))):
+            yield chunk
+    finally:
+        await run(connections.close_all)
+        executor.shutdown(wait=False)
+
+
+def csv_response(rows, headers, filename, asynchronous=False, chunk_size=EXPORT_CHUNK_SIZE):
+    lines = csv_lines(rows, headers)
+    content = async_chunks(lines, chunk_size) if asynchronous else lines
+    response = StreamingHttpResponse(content, content_type=CSV_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename={filename}.csv'
+    return response
+
+
+def xlsx_response(rows, headers, filename, title):
+    # Mode écriture seule : les lignes sont écrites au fil de l'eau dans un fichier temporaire
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=title[:31])
+    ws.append(headers)
+    for row in rows:
+        ws.append([excel_value(value) for value in row])
+
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+    # Le fichier est envoyé par blocs puis fermé (et supprimé) par FileResponse
+    return FileResponse(output, as_attachment=True, filename=f'{filename}.xlsx', content_type=XLSX_CONTENT_TYPE)
+
+
+def export_response(request, queryset, columns, filename, title=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Exporte le queryset en XLSX (par défaut) ou en CSV avec ?format=csv.
+    La mémoire utilisée ne dépend pas du nombre de lignes : le CSV est
+    produit pendant l'envoi de la réponse (par un itérateur asynchrone sous
+    ASGI), le XLSX est écrit sur disque.
+    """
+    headers = [column.header for column in columns]
+    rows = export_rows(queryset, columns, chunk_size)
+    if request.GET.get('format') == 'csv':
+        return csv_response(rows, headers, filename, isinstance(request, ASGIRequest), chunk_size)
+    return xlsx_response(rows, headers, filename, title or filename)
@@ -1,12 +1,12 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.db.models import Q
 from django.conf import settings
 from .models import Fournisseur,EmployeeProfile,User
 from .forms import FournisseurForm,EmployeeProfileForm,UserForm
-from openpyxl import Workbook
+from .exports import export_response, Column, file_url
 import json
 import os
 from django.core.paginator import Paginator
@@ -154,26 +154,13 @@ def employee_profile_list_export(request):
     else:
         employee_profiles = EmployeeProfile.objects.all().order_by('id')
 
-    # Créer un nouveau classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Employee Profiles"
-
-    # Ajouter les en-têtes
-    ws.append(["ID", "Name", "Position", "Salary", "Identity"])
-
-    # Ajouter les données des employés
-    for employee_profile in employee_profiles:
-        ws.append([employee_profile.id, employee_profile.user.name, employee_profile.position, employee_profile.salary, employee_profile.identity.url if employee_profile.identity else ""])
-
-    # Créer une réponse HTTP avec le fichier Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=employee_profiles.xlsx'
-
-    # Enregistrer le classeur dans la réponse
-    wb.save(response)
-
-    return response
+    return export_response(request, employee_profiles, [
+        Column("ID", 'id'),
+        Column("Name", 'user__name'),
+        Column("Position", 'position'),
+        Column("Salary", 'salary'),
+        Column("Identity", 'identity', file_url()),
+    ], 'employee_profiles', title="Employee Profiles")
 
 @csrf_exempt
 @login_required(login_url=login_path)
@@ -286,26 +273,13 @@ def fournisseur_list_export(request):
     else:
         fournisseurs = Fournisseur.objects.all().order_by('id')
 
-    # Créer un nouveau classeur
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Fournisseurs"
-
-    # Ajouter les en-têtes
-    ws.append(["ID", "Name", "Phone", "Address", "Details"])
-
-    # Ajouter les données des fournisseurs
-    for fournisseur in fournisseurs:
-        ws.append([fornisseur.id, fournisseur.name, fournisseur.phone, fournisseur.address, fournisseur.details])
-
-    # Créer une réponse HTTP avec le fichier Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=fournisseurs.xlsx'
-
-    # Enregistrer le classeur dans la réponse
-    wb.save(response)
-
-    return response
+    return export_response(request, fournisseurs, [
+        Column("ID", 'id'),
+        Column("Name", 'name'),
+        Column("Phone", 'phone'),
+        Column("Address", 'address'),
+        Column("Details", 'details'),
+    ], 'fournisseurs', title="Fournisseurs")
 
 @csrf_exempt
 @login_required(login_url=login_path)
@@ -1,13 +1,13 @@
 from django.shortcuts import render, get_object_or_404,redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.core.paginator import Paginator
 from django.db.models import Q
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.core.exceptions import ValidationError
-from openpyxl import Workbook
+from apps.users.exports import export_response, Column
 from .models import Order, OrderItem, Payment, Coupon,BatchAllocation
 from apps.produits.models import Product, ProductUnit,Discount,Category
 import json
@@ -301,22 +301,16 @@ def delete_order(request, id):
 
 @login_required(login_url=login_path)
 def export_orders(request):
-    """Exporte les commandes au format Excel."""
+    """Exporte les commandes au format Excel (ou CSV avec ?format=csv)."""
     orders = Order.objects.all().order_by('-created_at')
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Orders"
-    ws.append(["Order ID", "Customer", "Status", "Total Amount", "Created At"])
-
-    for order in orders:
-        ws.append([str(order.id), order.customer.username if order.customer else 'Anonymous', order.status, order.total_amount, order.created_at])
-
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = 'attachment; filename=Orders.xlsx'
-    wb.save(response)
-    return response
+
+    return export_response(request, orders, [
+        Column("Order ID", 'id', str),
+        Column("Customer", 'customer__username', lambda username: username or 'Anonymous'),
+        Column("Status", 'status'),
+        Column("Total Amount", 'total_amount'),
+        Column("Created At", 'created_at'),
+    ], 'Orders')
 
 @csrf_exempt
 @login_required(login_url=login_path)
@@ -2,6 +2,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path, include,re_path
 from apps.dashboard.html import index
+from kake.instrumentation import query_stats_view
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -54,6 +55,9 @@ urlpatterns = [
     # Allauth Endpoints
     path('auth/', include('allauth.urls')),
 
+    # Statistiques SQL par tenant (QueryInstrumentationMiddleware)
+    path('kake/query-stats/', query_stats_view, name='kake_query_stats'),
+
     # DRF-YASG
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class KakeConfig(AppConfig):
+    name = 'kake'
+
+    def ready(self):
+        # Importer les signaux
+        import kake.signals
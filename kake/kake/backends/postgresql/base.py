@@ -0,0 +1,46 @@
+from django.db.backends.postgresql import base
+from kake.pool import get_pool
+from kake.tenant_manager import get_current_schema
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Backend PostgreSQL dont les connexions sont recyclées par un pool du
+    processus (kake.pool) qui remet à chaque requête, si possible, une
+    connexion déjà placée sur le schéma de son tenant.
+
+    À utiliser avec CONN_MAX_AGE = 0 : en fin de requête, la connexion est
+    rendue au pool avec son search_path au lieu d'être fermée.
+    """
+
+    kake_pooled_schema = None
+    kake_requested_schema = None
+
+    def get_new_connection(self, conn_params):
+        # Le schéma demandé est connu avant la connexion : set_search_path le note d'abord
+        self.kake_requested_schema = get_current_schema()
+        raw, self.kake_pooled_schema = get_pool(self.alias).acquire(
+            self.kake_requested_schema, lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+        )
+        return raw
+
+    def connect(self):
+        super().connect()
+        # connection_created a remis le suivi à zéro : une connexion recyclée garde son search_path
+        self.kake_search_path = self.kake_pooled_schema
+        if self.kake_pooled_schema is not None and self.kake_pooled_schema != self.kake_requested_schema:
+            # Connexion placée sur le schéma d'un autre tenant : elle ne doit jamais être
+            # utilisée telle quelle, même par du code qui n'appelle pas set_search_path
+            self.kake_search_path = None
+            with self.cursor() as cursor:
+                cursor.execute("SET search_path TO %s;", [self.kake_requested_schema])
+            self.kake_search_path = self.kake_requested_schema
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = get_pool(self.alias)
+        if self.in_atomic_block or self.errors_occurred or not self.autocommit:
+            pool.discard(self.connection)
+        else:
+            pool.release(self.connection, getattr(self, "kake_search_path", None))
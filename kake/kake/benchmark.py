@@ -0,0 +1,63 @@
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models, router
+from django.http import HttpResponse
+from django.urls import path
+
+from .tenant_manager import get_current_schema, get_tenant_model
+
+# Préfixe des tenants synthétiques, supprimés à la fin de chaque mesure (sans "_",
+# refusé dans les noms d'hôte par Django)
+SCHEMA_PREFIX = "kakebench"
+
+
+def routing_view(request):
+    """
+    Route chaque modèle installé comme le ferait une requête ORM, sans
+    dépendre des tables du schéma (les tenants synthétiques n'en ont pas).
+    """
+    for model in apps.get_models():
+        router.db_for_read(model)
+        router.db_for_write(model)
+    return HttpResponse(get_current_schema())
+
+
+urlpatterns = [
+    path("", routing_view, name="kake_benchmark"),
+    # Cible de settings.URL404 pendant les mesures, résolue par TenantMiddleware
+    path("not-found/", routing_view, name="kake_benchmark_404"),
+]
+
+
+def synthetic_tenant(index, owner=None):
+    """
+    Construit un tenant non enregistré dont les champs obligatoires reçoivent
+    des valeurs uniques dérivées de son numéro.
+    """
+    Tenant = get_tenant_model()
+    schema_name = f"{SCHEMA_PREFIX}{index:05d}"
+    values = {"schema_name": schema_name}
+    for field in Tenant._meta.concrete_fields:
+        if field.name in values or field.primary_key or field.null or field.has_default():
+            continue
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False):
+            continue
+        if isinstance(field, models.EmailField):
+            values[field.name] = f"{schema_name}@benchmark.invalid"
+        elif isinstance(field, (models.CharField, models.TextField)):
+            values[field.name] = schema_name[:field.max_length] if field.max_length else schema_name
+        elif isinstance(field, models.ForeignKey) and field.related_model is get_user_model():
+            values[field.name] = owner
+    return Tenant(**values)
+
+
+def get_benchmark_owner():
+    # Propriétaire des tenants synthétiques lorsque le modèle Tenant en exige un
+    User = get_user_model()
+    return User.objects.filter(is_superuser=True).order_by("pk").first() or User.objects.order_by("pk").first()
+
+
+def benchmark_host(schema_name):
+    # Résolu par sous-domaine : aucun Domain n'est nécessaire
+    return f"{schema_name}.benchmark.{getattr(settings, 'MAIN_DOMAIN', 'localhost')}"
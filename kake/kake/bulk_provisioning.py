@@ -0,0 +1,202 @@
+import csv
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+
+from .pool import close_pool
+from .resolver import SCHEMA_NAME_RE, invalidate_tenant_cache
+from .schema_migration import init_worker
+from .tenant_manager import get_tenant_model, get_domain_model, set_search_path
+from .views.mixins import TenantCreationMixin
+
+CREATED = "created"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+# Colonnes du manifeste qui ne sont pas des champs du modèle Tenant
+ADMIN_COLUMNS = ("admin_email", "admin_username", "admin_password")
+DOMAIN_COLUMN = "domain"
+
+
+def read_manifest(path, format=None):
+    """
+    Lit un manifeste CSV (ligne d'en-tête) ou JSON (liste d'objets) et
+    retourne la liste des lignes sous forme de dictionnaires.
+    """
+    path = Path(path)
+    format = format or path.suffix.lstrip(".").lower()
+    with path.open(encoding="utf-8-sig", newline="") as handle:
+        if format == "json":
+            rows = json.load(handle)
+            if not isinstance(rows, list):
+                raise ValueError("Le manifeste JSON doit contenir une liste d'objets.")
+            return rows
+        if format == "csv":
+            return list(csv.DictReader(handle))
+    raise ValueError(f"Format de manifeste non pris en charge : {format}")
+
+
+def default_schema_name(name):
+    # Même règle que la création depuis la liste des compagnies
+    return name.lower().replace(" ", "_")
+
+
+def default_domain(name, suffix):
+    return f"{name.lower().replace(' ', '-')}.{suffix}"
+
+
+def prepare_tenants(rows, owner=None, domain_suffix=None):
+    """
+    Valide les lignes du manifeste et construit les tenants à créer.
+    Retourne (entries, results) : les entrées valides et les résultats déjà
+    connus (lignes en erreur ou tenants existants), avec le numéro de ligne.
+    """
+    Tenant = get_tenant_model()
+    domain_suffix = domain_suffix or getattr(settings, "MAIN_DOMAIN", "localhost")
+    field_names = {field.name for field in Tenant._meta.concrete_fields}
+    unique_fields = [
+        field.name for field in Tenant._meta.concrete_fields
+        if field.unique and not field.primary_key and field.name != "schema_name"
+    ]
+
+    entries, results = [], []
+    seen = {}
+    for line, row in enumerate(rows, start=1):
+        row = {key.strip(): (value.strip() if isinstance(value, str) else value) for key, value in row.items() if key}
+        name = row.get("name")
+        if not name:
+            results.append({"line": line, "name": "", "status": FAILED, "error": "Colonne 'name' manquante."})
+            continue
+
+        schema_name = row.get("schema_name") or default_schema_name(name)
+        domain = row.get(DOMAIN_COLUMN) or default_domain(name, domain_suffix)
+        error = None
+        if not SCHEMA_NAME_RE.match(schema_name):
+            error = f"Nom de schéma invalide : {schema_name}"
+        elif not row.get("admin_email"):
+            error = "Colonne 'admin_email' manquante : chaque tenant reçoit un administrateur."
+        else:
+            for key, value in (("schema_name", schema_name), (DOMAIN_COLUMN, domain), ("name", name)):
+                if (key, value) in seen:
+                    error = f"{key} '{value}' déjà utilisé ligne {seen[(key, value)]} du manifeste."
+                    break
+        if error:
+            results.append({"line": line, "name": name, "status": FAILED, "error": error})
+            continue
+        for key, value in (("schema_name", schema_name), (DOMAIN_COLUMN, domain), ("name", name)):
+            seen[(key, value)] = line
+
+        values = {key: value for key, value in row.items() if key in field_names and value not in (None, "")}
+        values.update(name=name, schema_name=schema_name)
+        if owner is not None and "user" in field_names:
+            values["user"] = owner
+        entries.append({
+            "line": line,
+            "tenant": Tenant(**values),
+            "domain": domain,
+            "admin": {key: row.get(key) for key in ADMIN_COLUMNS if row.get(key)},
+        })
+
+    # Conflits avec la base : une requête par champ unique, pour tout le manifeste
+    Domain = get_domain_model()
+    conflicts = {}
+    existing = set(Tenant.objects.filter(
+        schema_name__in=[entry["tenant"].schema_name for entry in entries]
+    ).values_list("schema_name", flat=True))
+    for entry in entries:
+        if entry["tenant"].schema_name in existing:
+            conflicts[entry["line"]] = (SKIPPED, "Tenant déjà existant.")
+    for field in unique_fields:
+        values = [getattr(entry["tenant"], field) for entry in entries if getattr(entry["tenant"], field, None)]
+        taken = set(Tenant.objects.filter(**{f"{field}__in": values}).values_list(field, flat=True))
+        for entry in entries:
+            if entry["line"] not in conflicts and getattr(entry["tenant"], field, None) in taken:
+                conflicts[entry["line"]] = (FAILED, f"{field} '{getattr(entry['tenant'], field)}' déjà utilisé.")
+    taken = set(Domain.objects.filter(domain__in=[entry["domain"] for entry in entries]).values_list("domain", flat=True))
+    for entry in entries:
+        if entry["line"] not in conflicts and entry["domain"] in taken:
+            conflicts[entry["line"]] = (FAILED, f"Domaine '{entry['domain']}' déjà utilisé.")
+
+    valid = []
+    for entry in entries:
+        if entry["line"] in conflicts:
+            status, error = conflicts[entry["line"]]
+            results.append({"line": entry["line"], "name": entry["tenant"].name, "status": status, "error": error})
+        else:
+            valid.append(entry)
+    return valid, results
+
+
+def create_tenant_rows(entries):
+    """
+    Crée les tenants et leurs domaines en deux requêtes groupées, dans une transaction.
+    """
+    Tenant = get_tenant_model()
+    Domain = get_domain_model()
+    with transaction.atomic():
+        tenants = Tenant.objects.bulk_create([entry["tenant"] for entry in entries])
+        Domain.objects.bulk_create([
+            Domain(domain=entry["domain"], tenant=tenant, is_primary=True)
+            for entry, tenant in zip(entries, tenants)
+        ])
+    # Les hôtes de ces tenants ont pu être mis en cache comme inconnus
+    invalidate_tenant_cache()
+
+
+def provision_tenant(schema_name, name, domain, admin):
+    """
+    Crée le schéma d'un tenant (clonage du schéma modèle s'il est à jour),
+    son administrateur et son site. Exécuté dans un worker du pool : le
+    schéma est supprimé en cas d'échec par create_and_migrate_tenant.
+    """
+    started = time.monotonic()
+    try:
+        # Utilisateur non enregistré : create_tenant_admin le recopie dans le schéma du tenant
+        admin_user = get_user_model()(
+            email=admin["admin_email"],
+            username=admin.get("admin_username") or admin["admin_email"].split("@")[0],
+            password=make_password(admin.get("admin_password")),
+        )
+        TenantCreationMixin().create_and_migrate_tenant(name, schema_name, domain, admin_user)
+        status, error = CREATED, ""
+    except Exception as e:
+        status, error = FAILED, str(e)
+    finally:
+        set_search_path("public")
+
+    return {"schema_name": schema_name, "status": status, "error": error, "duration": time.monotonic() - started}
+
+
+def provision_tenants(entries, jobs=1):
+    """
+    Provisionne les schémas des tenants créés et produit les résultats au fur
+    et à mesure, en parallèle dans un pool de processus lorsque jobs > 1.
+    """
+    arguments = [
+        (entry["tenant"].schema_name, entry["tenant"].name, entry["domain"], entry["admin"])
+        for entry in entries
+    ]
+    if jobs <= 1:
+        for args in arguments:
+            yield provision_tenant(*args)
+        return
+
+    # Les workers ne doivent pas hériter de la connexion ouverte du parent, ni des
+    # connexions inactives du pool de kake (où close_all vient de la rendre)
+    connections.close_all()
+    close_pool()
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as executor:
+        futures = {executor.submit(provision_tenant, *args): args[0] for args in arguments}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # Le worker a disparu avant de pouvoir renvoyer son résultat
+                yield {"schema_name": futures[future], "status": FAILED, "error": str(e), "duration": None}
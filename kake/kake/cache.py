@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .tenant_manager import get_current_schema
+
+# Les clés internes de kake (générations, journaux...) sont communes à tous les tenants
+SHARED_PREFIX = "kake:"
+GENERATION_PREFIX = f"{SHARED_PREFIX}generation:"
+
+
+def get_generation_cache():
+    return caches[getattr(settings, "TENANT_CACHE_ALIAS", "default")]
+
+
+def generation_key(schema_name):
+    return f"{GENERATION_PREFIX}{schema_name}"
+
+
+def get_generation(schema_name):
+    """
+    Retourne la génération courante du cache d'un tenant, en l'initialisant si
+    nécessaire. La valeur initiale est horodatée : si la clé est évincée, les
+    anciennes entrées ne peuvent pas redevenir visibles.
+    """
+    cache = get_generation_cache()
+    key = generation_key(schema_name)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def make_key(key, key_prefix, version):
+    """
+    KEY_FUNCTION pour CACHES : préfixe chaque clé par le schéma du tenant actif
+    et par sa génération, afin qu'aucune entrée ne soit partagée entre tenants.
+
+        CACHES = {'default': {..., 'KEY_FUNCTION': 'kake.cache.make_key'}}
+    """
+    if key.startswith(SHARED_PREFIX):
+        return f"{key_prefix}:{version}:{key}"
+
+    schema_name = get_current_schema()
+    return f"{key_prefix}:{version}:{schema_name}:{get_generation(schema_name)}:{key}"
+
+
+def invalidate_tenant(schema_name):
+    """
+    Rend inaccessibles toutes les entrées de cache d'un tenant en incrémentant
+    sa génération ; les anciennes entrées expirent d'elles-mêmes.
+    """
+    cache = get_generation_cache()
+    key = generation_key(schema_name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Génération absente (jamais initialisée ou évincée)
+        cache.set(key, int(time.time() * 1000), timeout=None)
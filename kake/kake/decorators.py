@@ -1,6 +1,8 @@
 from django.http import HttpResponseForbidden
 from functools import wraps
 
+from .schemas import known_schemas
+
 def tenant_required(view_func):
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
@@ -16,16 +18,14 @@ def tenant_required(view_func):
     
     return _wrapped_view
 
-def is_valid_tenant(tenant_schema):
+def is_valid_tenant(tenant):
     """
     Vérifie si le schéma du tenant existe dans la base de données.
-    Cette fonction peut être ajustée selon votre logique de validation des tenants.
+    La vérification se fait dans l'ensemble des schémas connus du processus,
+    chargé une fois depuis pg_namespace et tenu à jour par les signaux de kake.
     """
-    # Ici, vous pouvez implémenter la logique de validation, par exemple en vérifiant
-    # si le schéma existe dans votre base de données PostgreSQL ou si le tenant est valide
+    schema_name = getattr(tenant, 'schema_name', tenant)
     try:
-        with connection.cursor() as cursor:
-            cursor.execute(f"SELECT schema_name FROM information_schema.schemata WHERE schema_name = %s;", [tenant_schema])
-            return cursor.fetchone() is not None
+        return schema_name in known_schemas
     except Exception as e:
         return False
@@ -0,0 +1,127 @@
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.utils import timezone
+
+from .pgtools import dump_schema_to_file, restore_schema_from_file
+from .schema_migration import ensure_state_table, migrate_schema, DONE
+from .schemas import schema_created, schema_dropped
+from .sharding import freeze_tenant, publish_hibernation, clear_tenant_state
+from .tenant_manager import get_tenant_model, get_tenant_database
+
+
+def get_hibernation_dir():
+    path = getattr(settings, "TENANT_HIBERNATION_DIR", None)
+    if not path:
+        raise ImproperlyConfigured("TENANT_HIBERNATION_DIR must be defined to hibernate tenants.")
+    return Path(path)
+
+
+def archive_path(schema_name):
+    return get_hibernation_dir() / f"{schema_name}.dump"
+
+
+def is_hibernated(tenant):
+    return getattr(tenant, "hibernated_at", None) is not None
+
+
+def schema_exists_on(database, schema_name):
+    with connections[database].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_catalog.pg_namespace WHERE nspname = %s;", [schema_name])
+        return cursor.fetchone() is not None
+
+
+def hibernate_tenant(tenant, drain=2.0):
+    """
+    Archive le schéma du tenant dans TENANT_HIBERNATION_DIR puis le supprime
+    de sa base. Les écritures du tenant sont gelées pendant l'archivage, et le
+    schéma n'est supprimé qu'une fois l'archive complète écrite sur le disque.
+    """
+    Tenant = get_tenant_model()
+    schema_name = tenant.schema_name
+    database = get_tenant_database(tenant)
+    path = archive_path(schema_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    freeze_tenant(schema_name)
+    try:
+        time.sleep(drain)
+        partial = path.with_name(f"{path.name}.partial")
+        dump_schema_to_file(database, schema_name, partial)
+        os.replace(partial, path)
+
+        hibernated_at = timezone.now()
+        Tenant.objects.filter(pk=tenant.pk).update(hibernated_at=hibernated_at)
+        try:
+            conn = connections[database]
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA {conn.ops.quote_name(schema_name)} CASCADE;")
+        except Exception:
+            Tenant.objects.filter(pk=tenant.pk).update(hibernated_at=None)
+            raise
+    except Exception:
+        clear_tenant_state(schema_name)
+        raise
+
+    tenant.hibernated_at = hibernated_at
+    publish_hibernation(schema_name)
+    schema_dropped.send(sender=None, schema_name=schema_name)
+    return path
+
+
+def wake_tenant(tenant):
+    """
+    Restaure le schéma d'un tenant hiberné et applique les migrations ajoutées
+    depuis son archivage. Un verrou consultatif sérialise les réveils : si un
+    autre processus a déjà restauré le tenant, l'appel se contente de mettre
+    l'instance à jour. Retourne True si le schéma a été restauré par cet appel.
+    """
+    Tenant = get_tenant_model()
+    schema_name = tenant.schema_name
+    database = get_tenant_database(tenant)
+    lock = f"kake:wake:{schema_name}"
+
+    with connections[database].cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(hashtext(%s));", [lock])
+    try:
+        if Tenant.objects.filter(pk=tenant.pk, hibernated_at__isnull=True).exists():
+            tenant.hibernated_at = None
+            return False
+
+        # Une restauration précédente a pu aboutir sans que les migrations passent
+        if not schema_exists_on(database, schema_name):
+            path = archive_path(schema_name)
+            if not path.exists():
+                raise RuntimeError(f"Archive introuvable pour le tenant '{schema_name}' : {path}")
+            restore_schema_from_file(database, path)
+        schema_created.send(sender=None, schema_name=schema_name)
+
+        ensure_state_table()
+        result = migrate_schema(schema_name, verbosity=0, database=database)
+        if result["status"] != DONE:
+            raise RuntimeError(f"Migration du tenant '{schema_name}' après réveil : {result['error']}")
+
+        Tenant.objects.filter(pk=tenant.pk).update(hibernated_at=None, last_activity=timezone.localdate())
+        tenant.hibernated_at = None
+        clear_tenant_state(schema_name)
+        archive_path(schema_name).unlink(missing_ok=True)
+        return True
+    finally:
+        with connections[database].cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(hashtext(%s));", [lock])
+
+
+def record_activity(tenant):
+    """
+    Note le jour de la dernière requête du tenant : au plus une écriture par
+    tenant et par jour dans chaque processus, l'instance étant celle du cache
+    de résolution.
+    """
+    today = timezone.localdate()
+    if getattr(tenant, "last_activity", today) != today:
+        get_tenant_model().objects.filter(pk=tenant.pk).update(last_activity=today)
+        tenant.last_activity = today
@@ -0,0 +1,186 @@
+import heapq
+import logging
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+
+from .pool import pool_stats
+
+logger = logging.getLogger(__name__)
+
+# Préfixe commun à tous les tenants (voir kake.cache.SHARED_PREFIX)
+LOG_PREFIX = "kake:querylog:"
+
+
+def get_log_cache():
+    return caches[getattr(settings, "TENANT_QUERY_LOG_CACHE", "default")]
+
+
+def get_log_size():
+    return getattr(settings, "TENANT_QUERY_LOG_SIZE", 500)
+
+
+class QueryRecorder:
+    """
+    Wrapper d'exécution (connection.execute_wrapper) qui compte les requêtes,
+    cumule le temps passé en base et conserve les requêtes les plus lentes.
+    """
+
+    def __init__(self, keep_slowest=5):
+        self.keep_slowest = keep_slowest
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.total_time += duration
+            # Tas minimal borné : la plus rapide des requêtes conservées est évincée
+            entry = (duration, self.count, sql)
+            if len(self.slowest) < self.keep_slowest:
+                heapq.heappush(self.slowest, entry)
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def slowest_statements(self):
+        return [
+            {"sql": sql, "time": round(duration * 1000, 3)}
+            for duration, _, sql in sorted(self.slowest, reverse=True)
+        ]
+
+
+def record_entry(entry):
+    """
+    Ajoute une mesure au tampon circulaire partagé : un compteur incrémenté
+    atomiquement désigne l'emplacement à écraser. Une erreur du cache ne doit
+    jamais faire échouer la requête mesurée : la mesure est alors perdue.
+    """
+    cache = get_log_cache()
+    counter_key = f"{LOG_PREFIX}counter"
+    try:
+        try:
+            position = cache.incr(counter_key)
+        except ValueError:
+            cache.add(counter_key, 0, timeout=None)
+            position = cache.incr(counter_key)
+        cache.set(f"{LOG_PREFIX}{position % get_log_size()}", entry, timeout=None)
+    except Exception as e:
+        logger.warning("Query log entry dropped: %s", e)
+
+
+def read_entries():
+    """
+    Retourne les mesures présentes dans le tampon, de la plus ancienne à la plus récente.
+    """
+    cache = get_log_cache()
+    keys = [f"{LOG_PREFIX}{slot}" for slot in range(get_log_size())]
+    entries = list(cache.get_many(keys).values())
+    return sorted(entries, key=lambda entry: entry["timestamp"])
+
+
+def clear_entries():
+    cache = get_log_cache()
+    cache.delete_many([f"{LOG_PREFIX}{slot}" for slot in range(get_log_size())])
+
+
+def summarize(entries):
+    """
+    Agrège les mesures par tenant et par vue, les plus coûteuses en premier.
+    """
+    groups = defaultdict(list)
+    for entry in entries:
+        groups[(entry["schema"], entry["view"])].append(entry)
+
+    summary = []
+    for (schema, view), group in groups.items():
+        queries = [entry["queries"] for entry in group]
+        db_times = [entry["db_time"] for entry in group]
+        slowest = max(
+            (statement for entry in group for statement in entry["slowest"]),
+            key=lambda statement: statement["time"],
+            default=None,
+        )
+        summary.append({
+            "schema": schema,
+            "view": view,
+            "requests": len(group),
+            "total_queries": sum(queries),
+            "avg_queries": round(sum(queries) / len(group), 1),
+            "max_queries": max(queries),
+            "total_db_time": round(sum(db_times), 3),
+            "avg_db_time": round(sum(db_times) / len(group), 3),
+            "slowest": slowest,
+        })
+    return sorted(summary, key=lambda row: row["total_queries"], reverse=True)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Middleware optionnel mesurant les requêtes SQL de chaque requête HTTP, par
+    tenant et par vue. À placer après kake.middleware.TenantMiddleware.
+    Les requêtes de toutes les bases sont comptées : un tenant peut être
+    hébergé sur un autre shard que la base par défaut.
+    """
+
+    def __init__(self, get_response):
+        if isinstance(get_log_cache(), DummyCache):
+            # Aucune mesure ne peut être conservée : inutile de ralentir les requêtes
+            raise MiddlewareNotUsed("TENANT_QUERY_LOG_CACHE ne doit pas être un DummyCache.")
+        self.get_response = get_response
+        self.keep_slowest = getattr(settings, "TENANT_QUERY_LOG_SLOWEST", 5)
+
+    def __call__(self, request):
+        recorder = QueryRecorder(self.keep_slowest)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        tenant = getattr(request, "tenant", None)
+        resolver_match = getattr(request, "resolver_match", None)
+        record_entry({
+            "timestamp": time.time(),
+            "schema": tenant.schema_name if tenant else "public",
+            "view": resolver_match.view_name if resolver_match else request.path,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": recorder.count,
+            "db_time": round(recorder.total_time * 1000, 3),
+            "duration": round(duration * 1000, 3),
+            "slowest": recorder.slowest_statements(),
+        })
+        return response
+
+
+def query_stats_view(request):
+    """
+    Statistiques SQL par tenant et par vue, au format JSON (personnel uniquement).
+    Paramètres : `schema` pour filtrer un tenant, `raw=1` pour les mesures brutes.
+    `pool` contient les compteurs du pool de connexions du processus qui répond.
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': 'Accès réservé au personnel.'}, status=403)
+
+    entries = read_entries()
+    schema = request.GET.get('schema')
+    if schema:
+        entries = [entry for entry in entries if entry["schema"] == schema]
+
+    if request.GET.get('raw'):
+        return JsonResponse({'entries': entries})
+    return JsonResponse({'requests': len(entries), 'summary': summarize(entries), 'pool': pool_stats()})
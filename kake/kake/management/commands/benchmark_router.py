@@ -0,0 +1,52 @@
+import timeit
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from kake.router import TenantRouter
+
+
+class UncachedTenantRouter:
+    """
+    Routage d'origine, qui relit SHARED_APPS et parcourt la liste à chaque appel.
+    Conservé uniquement comme point de comparaison.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in getattr(settings, 'SHARED_APPS', []):
+            return 'default'
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label in getattr(settings, 'SHARED_APPS', []):
+            return 'default'
+        return None
+
+
+class Command(BaseCommand):
+    help = "Mesure le coût par appel du routage TenantRouter, avant et après mise en cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=100000, help="Appels par mesure (défaut : 100000).")
+        parser.add_argument('--repeat', type=int, default=5, help="Nombre de mesures, la meilleure est retenue.")
+
+    def handle(self, *args, **options):
+        models = apps.get_models()
+        number, repeat = options['number'], options['repeat']
+
+        results = {}
+        for label, router in (("avant", UncachedTenantRouter()), ("après", TenantRouter())):
+            def route():
+                for model in models:
+                    router.db_for_read(model)
+                    router.db_for_write(model)
+
+            route()  # Amorcer les caches du routeur
+            best = min(timeit.repeat(route, number=max(number // len(models), 1), repeat=repeat))
+            calls = max(number // len(models), 1) * len(models) * 2
+            results[label] = best / calls * 1e9
+            self.stdout.write(f"{label:<6} : {results[label]:8.1f} ns par appel ({calls} appels, {len(models)} modèles)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Gain : x{results['avant'] / results['après']:.1f} sur le coût de routage par requête."
+        ))
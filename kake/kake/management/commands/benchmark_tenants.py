@@ -0,0 +1,127 @@
+import json
+import platform
+import statistics
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from kake.benchmark import SCHEMA_PREFIX, synthetic_tenant, get_benchmark_owner, benchmark_host
+from kake.instrumentation import QueryRecorder
+from kake.resolver import tenant_cache
+from kake.tenant_manager import get_tenant_model, reset_search_path_tracking
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le coût de kake par requête (résolution du tenant, changement de schéma, routage) "
+        "avec le client de test, pour 1, 100 et 1000 tenants synthétiques. Résultat en JSON."
+    )
+
+    # Scénario -> (TenantMiddleware actif, cache de résolution vidé avant chaque requête, tenants parcourus)
+    SCENARIOS = {
+        "baseline": (False, False, "one"),  # Sans kake : coût du client de test et de la vue
+        "cold": (True, True, "all"),        # Résolution en base et SET search_path à chaque requête
+        "rotating": (True, False, "all"),   # Résolution en cache, SET search_path à chaque changement de tenant
+        "sticky": (True, False, "one"),     # Résolution en cache, connexion déjà sur le schéma
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenants', default='1,100,1000',
+            help="Nombres de tenants synthétiques, séparés par des virgules (défaut : 1,100,1000).",
+        )
+        parser.add_argument('--requests', type=int, default=500, help="Requêtes mesurées par scénario (défaut : 500).")
+        parser.add_argument('--warmup', type=int, default=20, help="Requêtes non mesurées avant chaque scénario.")
+        parser.add_argument(
+            '--full-stack', action='store_true',
+            help="Conserve tous les middlewares du projet au lieu du seul TenantMiddleware.",
+        )
+        parser.add_argument('--output', help="Écrit le résultat JSON dans ce fichier au lieu de la sortie standard.")
+
+    def handle(self, *args, **options):
+        try:
+            matrix = [int(value) for value in options['tenants'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError("--tenants attend des entiers séparés par des virgules.")
+        if options['requests'] < 2:
+            raise CommandError("--requests doit valoir au moins 2 pour calculer des percentiles.")
+
+        middleware = list(settings.MIDDLEWARE) if options['full_stack'] else ['kake.middleware.TenantMiddleware']
+
+        report = {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "requests": options['requests'],
+            "full_stack": options['full_stack'],
+            "results": {},
+        }
+
+        Tenant = get_tenant_model()
+        owner = get_benchmark_owner()
+        for count in matrix:
+            self.stderr.write(f"{count} tenant(s)...")
+            Tenant.objects.filter(schema_name__startswith=SCHEMA_PREFIX).delete()
+            tenants = Tenant.objects.bulk_create([synthetic_tenant(index, owner) for index in range(count)])
+            hosts = [benchmark_host(tenant.schema_name) for tenant in tenants]
+            try:
+                report["results"][str(count)] = {
+                    name: self.run_scenario(hosts, middleware, *scenario, options)
+                    for name, scenario in self.SCENARIOS.items()
+                }
+            finally:
+                Tenant.objects.filter(schema_name__startswith=SCHEMA_PREFIX).delete()
+                tenant_cache.clear()
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(output + "\n")
+            self.stderr.write(self.style.SUCCESS(f"Résultat écrit dans {options['output']}."))
+        else:
+            self.stdout.write(output)
+
+    def run_scenario(self, hosts, middleware, with_kake, cold, spread, options):
+        stack = middleware if with_kake else [entry for entry in middleware if entry != 'kake.middleware.TenantMiddleware']
+        if spread == "one":
+            hosts = hosts[:1]
+
+        with override_settings(
+            MIDDLEWARE=stack,
+            ALLOWED_HOSTS=['*'],
+            ROOT_URLCONF='kake.benchmark',
+            TENANT_URLCONF='kake.benchmark',
+            URL404='kake_benchmark_404',
+        ):
+            client = Client()
+            tenant_cache.clear()
+            reset_search_path_tracking()
+            for position in range(options['warmup']):
+                client.get('/', HTTP_HOST=hosts[position % len(hosts)])
+
+            latencies, queries = [], []
+            for position in range(options['requests']):
+                host = hosts[position % len(hosts)]
+                if cold:
+                    tenant_cache.clear()
+                recorder = QueryRecorder(keep_slowest=1)
+                with connection.execute_wrapper(recorder):
+                    started = time.perf_counter()
+                    response = client.get('/', HTTP_HOST=host)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f"Réponse {response.status_code} pour {host} : {response.content[:200]!r}")
+                queries.append(recorder.count)
+
+        percentiles = statistics.quantiles(latencies, n=100)
+        return {
+            "p50_ms": round(percentiles[49], 4),
+            "p95_ms": round(percentiles[94], 4),
+            "mean_ms": round(statistics.fmean(latencies), 4),
+            "queries_per_request": round(statistics.fmean(queries), 3),
+            "tenants": len(hosts),
+        }
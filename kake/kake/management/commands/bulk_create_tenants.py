@@ -0,0 +1,92 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from kake.bulk_provisioning import (
+    read_manifest, prepare_tenants, create_tenant_rows, provision_tenants, CREATED, FAILED,
+)
+from kake.tenant_manager import get_tenant_model
+
+
+class Command(BaseCommand):
+    help = (
+        "Crée en une fois les tenants décrits par un manifeste CSV ou JSON : lignes Tenant et "
+        "Domain groupées, schémas provisionnés en parallèle, administrateur créé dans chaque schéma."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'manifest',
+            help="Fichier CSV ou JSON : name, admin_email (obligatoires), schema_name, domain, "
+                 "admin_username, admin_password et tout champ du modèle Tenant.",
+        )
+        parser.add_argument('--format', choices=['csv', 'json'], help="Format du manifeste (défaut : extension du fichier).")
+        parser.add_argument('--jobs', '-j', type=int, default=4, help="Processus de provisionnement en parallèle (défaut : 4).")
+        parser.add_argument('--owner', help="Email de l'utilisateur propriétaire des tenants créés (champ user du tenant).")
+        parser.add_argument('--domain-suffix', help="Suffixe des domaines générés (défaut : settings.MAIN_DOMAIN).")
+        parser.add_argument('--report', help="Écrit le résultat de chaque ligne dans ce fichier JSON.")
+        parser.add_argument('--dry-run', action='store_true', help="Valide le manifeste sans rien créer.")
+
+    def handle(self, *args, **options):
+        try:
+            rows = read_manifest(options['manifest'], options['format'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Manifeste illisible : {e}")
+
+        owner = None
+        Tenant = get_tenant_model()
+        if any(field.name == 'user' for field in Tenant._meta.concrete_fields):
+            if not options['owner']:
+                raise CommandError(f"{Tenant._meta.label} exige un propriétaire : indiquez --owner.")
+            try:
+                owner = get_user_model().objects.get(email=options['owner'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Aucun utilisateur avec l'email {options['owner']}.")
+
+        entries, results = prepare_tenants(rows, owner=owner, domain_suffix=options['domain_suffix'])
+        self.stdout.write(f"{len(rows)} ligne(s) lue(s), {len(entries)} tenant(s) à créer.")
+
+        if entries and not options['dry_run']:
+            started = time.monotonic()
+            create_tenant_rows(entries)
+            self.stdout.write(f"Tenants et domaines enregistrés, provisionnement avec {max(options['jobs'], 1)} processus...")
+
+            lines = {entry['tenant'].schema_name: entry for entry in entries}
+            failed = []
+            for position, result in enumerate(provision_tenants(entries, jobs=max(options['jobs'], 1)), start=1):
+                entry = lines[result['schema_name']]
+                results.append({
+                    "line": entry['line'],
+                    "name": entry['tenant'].name,
+                    "status": result['status'],
+                    "error": result['error'],
+                })
+                if result['status'] == FAILED:
+                    failed.append(entry['tenant'].pk)
+                    self.stderr.write(f"[{position}/{len(entries)}] {result['schema_name']} : échec ({result['error']})")
+                else:
+                    self.stdout.write(f"[{position}/{len(entries)}] {result['schema_name']} : créé")
+
+            # Un tenant sans schéma ne doit pas rester en base : la ligne pourra être rejouée
+            if failed:
+                Tenant.objects.filter(pk__in=failed).delete()
+            self.stdout.write(f"Provisionnement terminé en {time.monotonic() - started:.1f} s.")
+
+        self.report(sorted(results, key=lambda result: result['line']), options)
+
+    def report(self, results, options):
+        failures = [result for result in results if result['status'] == FAILED]
+        for result in failures:
+            self.stderr.write(f"ligne {result['line']} ({result['name'] or '?'}) : {result['error']}")
+
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as handle:
+                json.dump(results, handle, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Rapport écrit dans {options['report']}.")
+
+        created = sum(1 for result in results if result['status'] == CREATED)
+        summary = f"{created} créé(s), {len(failures)} en échec, {len(results) - created - len(failures)} ignoré(s)."
+        if failures:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from kake.hibernation import hibernate_tenant, wake_tenant
+from kake.tenant_manager import get_tenant_model
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive puis supprime le schéma des tenants inactifs (hibernation), ou les "
+        "restaure avec --wake. Une requête vers un tenant hiberné le restaure aussi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_names', nargs='*', help="Schémas des tenants à traiter.")
+        parser.add_argument(
+            '--inactive', action='store_true',
+            help="Sélectionne les tenants désactivés (is_active=False).",
+        )
+        parser.add_argument(
+            '--idle-days', type=int,
+            help="Sélectionne les tenants sans requête depuis ce nombre de jours.",
+        )
+        parser.add_argument('--wake', action='store_true', help="Restaure les tenants au lieu de les archiver.")
+        parser.add_argument('--dry-run', action='store_true', help="Affiche les tenants sélectionnés sans rien modifier.")
+
+    def handle(self, *args, **options):
+        Tenant = get_tenant_model()
+        if not (options['schema_names'] or options['inactive'] or options['idle_days'] is not None):
+            raise CommandError("Indiquez des schémas, --inactive ou --idle-days.")
+
+        selection = Q()
+        if options['schema_names']:
+            selection |= Q(schema_name__in=options['schema_names'])
+        if options['inactive']:
+            if not any(field.name == 'is_active' for field in Tenant._meta.get_fields()):
+                raise CommandError(f"{Tenant._meta.label} n'a pas de champ is_active.")
+            selection |= Q(is_active=False)
+        if options['idle_days'] is not None:
+            limit = timezone.localdate() - timedelta(days=options['idle_days'])
+            # Un tenant jamais visité depuis l'activation du suivi compte depuis sa création
+            selection |= Q(last_activity__lt=limit) | Q(last_activity__isnull=True, created_at__date__lt=limit)
+
+        tenants = Tenant.objects.filter(selection, hibernated_at__isnull=not options['wake']).order_by('schema_name')
+        action = "Réveil" if options['wake'] else "Hibernation"
+        self.stdout.write(f"{action} de {tenants.count()} tenant(s).")
+
+        failures = 0
+        for tenant in tenants:
+            if options['dry_run']:
+                self.stdout.write(f"  {tenant.schema_name}")
+                continue
+            try:
+                if options['wake']:
+                    wake_tenant(tenant)
+                    self.stdout.write(f"  {tenant.schema_name} : restauré")
+                else:
+                    path = hibernate_tenant(tenant)
+                    self.stdout.write(f"  {tenant.schema_name} : archivé dans {path}")
+            except Exception as e:
+                failures += 1
+                self.stderr.write(f"  {tenant.schema_name} : échec ({e})")
+
+        if failures:
+            raise CommandError(f"{failures} tenant(s) en échec.")
+        self.stdout.write(self.style.SUCCESS(f"{action} terminé."))
@@ -1,9 +1,16 @@
 #la fiche des commandes
-from django.core.management.base import BaseCommand
-from django.db import connection, OperationalError
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-from django.core.management import call_command
 from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS
+from kake.schema_migration import (
+    ensure_state_table, reset_state, add_pending, completed_schemas, migrate_schemas,
+    up_to_date_schemas, mark_up_to_date, DONE,
+)
+from kake.template_schema import get_template_schema
 
 
 def get_tenant_model():
@@ -16,45 +23,113 @@ def get_tenant_model():
 class Command(BaseCommand):
     help = "Effectue les migrations pour chaque tenant (schéma) existant, en créant le schéma si nécessaire."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jobs', '-j', type=int, default=1,
+            help="Nombre de processus migrant des tenants en parallèle (défaut : 1).",
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help="Reprend un run interrompu en ignorant les tenants déjà migrés avec succès.",
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Lance migrate même pour les tenants dont les migrations sont déjà à jour.",
+        )
+        parser.add_argument(
+            '--database',
+            help="Ne migre que les tenants hébergés par cette base (alias de settings.DATABASES).",
+        )
+
     def handle(self, *args, **options):
         Tenant = get_tenant_model()
-        tenants = Tenant.objects.all()
+        # Les tenants hibernés sont migrés à leur réveil
+        tenants = Tenant.objects.filter(hibernated_at__isnull=True)
+        if options['database']:
+            tenants = tenants.filter(database=options['database'])
+        placements = dict(tenants.values_list('schema_name', 'database'))
+        schema_names = list(placements)
 
-        for tenant in tenants:
-            self.stdout.write(f"Traitement du tenant : {tenant.schema_name}")
+        # Le schéma modèle, cloné à chaque création de tenant, est migré en premier
+        template = get_template_schema()
+        if template and options['database'] in (None, DEFAULT_DB_ALIAS):
+            schema_names.insert(0, template)
+            placements[template] = DEFAULT_DB_ALIAS
 
-            # Vérifier si le schéma existe
-            if not self.schema_exists(tenant.schema_name):
-                self.stdout.write(f"Schéma {tenant.schema_name} non trouvé. Création...")
-                self.create_schema(tenant.schema_name)
-            else:
-                self.stdout.write(f"Schéma {tenant.schema_name} déjà existant.")
+        ensure_state_table()
+        if options['resume']:
+            add_pending(schema_names)
+            done = completed_schemas()
+            skipped = [schema_name for schema_name in schema_names if schema_name in done]
+            schema_names = [schema_name for schema_name in schema_names if schema_name not in done]
+            self.stdout.write(f"Reprise : {len(skipped)} tenant(s) déjà migré(s) ignoré(s).")
+        else:
+            skipped = []
+            reset_state(schema_names)
+
+        # Les tenants sont migrés base par base, chacun sur la base qui héberge son schéma
+        by_database = defaultdict(list)
+        for schema_name in schema_names:
+            by_database[placements[schema_name]].append(schema_name)
+
+        # Ignorer les tenants dont django_migrations contient déjà les migrations feuilles
+        current = set()
+        if not options['force']:
+            for database, names in by_database.items():
+                current |= up_to_date_schemas(names, database)
+        if current:
+            mark_up_to_date(current)
+            schema_names = [schema_name for schema_name in schema_names if schema_name not in current]
+            self.stdout.write(f"{len(current)} tenant(s) déjà à jour ignoré(s).")
+
+        jobs = max(options['jobs'], 1)
+        self.stdout.write(f"Migration de {len(schema_names)} tenant(s) avec {jobs} processus...")
 
-            # Définir le search_path sur le schéma actuel
-            try:
-                with connection.cursor() as cursor:
-                    cursor.execute(f"SET search_path TO {tenant.schema_name};")
-                    self.stdout.write(f"Migrations pour le schéma : {tenant.schema_name}")
-                    call_command('migrate', interactive=False)
-            except OperationalError as e:
-                self.stderr.write(f"Erreur lors de la migration pour {tenant.schema_name} : {str(e)}")
+        started = time.monotonic()
+        results = []
+        verbosity = options['verbosity'] if jobs == 1 else 0
+        for database, names in by_database.items():
+            names = [schema_name for schema_name in names if schema_name not in current]
+            for result in migrate_schemas(names, jobs=jobs, verbosity=verbosity, database=database):
+                results.append(result)
+                self.report_progress(result, len(results), len(schema_names))
 
+        self.report_summary(results, skipped + sorted(current), time.monotonic() - started)
+
+        failures = [result for result in results if result['status'] != DONE]
+        if failures:
+            raise CommandError(
+                f"{len(failures)} tenant(s) en échec. Relancez avec --resume pour reprendre."
+            )
         self.stdout.write(self.style.SUCCESS("Migrations terminées pour tous les tenants."))
 
-    def schema_exists(self, schema_name):
-        """
-        Vérifie si un schéma PostgreSQL existe.
-        """
-        query = "SELECT schema_name FROM information_schema.schemata WHERE schema_name = %s;"
-        with connection.cursor() as cursor:
-            cursor.execute(query, [schema_name])
-            return cursor.fetchone() is not None
+    def report_progress(self, result, position, total):
+        duration = self.format_duration(result['duration'])
+        if result['status'] == DONE:
+            self.stdout.write(f"[{position}/{total}] {result['schema_name']} migré en {duration}")
+        else:
+            self.stderr.write(
+                f"[{position}/{total}] Erreur lors de la migration pour {result['schema_name']} : {result['error']}"
+            )
 
-    def create_schema(self, schema_name):
+    def report_summary(self, results, skipped, elapsed):
         """
-        Crée un nouveau schéma PostgreSQL.
+        Affiche la durée et le statut de chaque schéma, puis les totaux du run.
         """
-        query = f"CREATE SCHEMA IF NOT EXISTS {schema_name};"
-        with connection.cursor() as cursor:
-            cursor.execute(query)
-        self.stdout.write(f"Schéma {schema_name} créé avec succès.")
+        self.stdout.write("\nRésumé des migrations :")
+        width = max([len(result['schema_name']) for result in results] + [6])
+        for result in sorted(results, key=lambda result: result['duration'] or 0, reverse=True):
+            line = f"  {result['schema_name']:<{width}}  {result['status']:<7}  {self.format_duration(result['duration']):>9}"
+            if result['status'] == DONE:
+                self.stdout.write(line)
+            else:
+                self.stderr.write(f"{line}  {result['error']}")
+
+        migrated = sum(1 for result in results if result['status'] == DONE)
+        self.stdout.write(
+            f"{migrated} migré(s), {len(results) - migrated} en échec, "
+            f"{len(skipped)} ignoré(s) en {elapsed:.2f}s."
+        )
+
+    def format_duration(self, duration):
+        return f"{duration:.2f}s" if duration is not None else "-"
@@ -0,0 +1,96 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from kake.pgtools import copy_schema_between, schema_row_counts
+from kake.sharding import freeze_tenant, publish_placement, clear_tenant_state
+from kake.tenant_manager import get_tenant_model, get_tenant_database
+
+
+def schema_exists_on(database, schema_name):
+    with connections[database].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_catalog.pg_namespace WHERE nspname = %s;", [schema_name])
+        return cursor.fetchone() is not None
+
+
+def drop_schema_on(database, schema_name):
+    with connections[database].cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {connections[database].ops.quote_name(schema_name)} CASCADE;")
+
+
+class Command(BaseCommand):
+    help = (
+        "Déplace le schéma d'un tenant vers une autre base (shard). Les écritures du "
+        "tenant sont gelées pendant la copie ; les lectures restent servies."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_name', help="Schéma du tenant à déplacer.")
+        parser.add_argument('database', help="Alias de la base de destination (settings.DATABASES).")
+        parser.add_argument(
+            '--drain', type=float, default=2.0,
+            help="Secondes laissées aux requêtes en cours avant la copie (défaut : 2).",
+        )
+        parser.add_argument(
+            '--drop-source', action='store_true',
+            help="Supprime le schéma de la base d'origine une fois le déplacement terminé.",
+        )
+
+    def handle(self, *args, **options):
+        schema_name, target = options['schema_name'], options['database']
+        Tenant = get_tenant_model()
+        try:
+            tenant = Tenant.objects.get(schema_name=schema_name)
+        except Tenant.DoesNotExist:
+            raise CommandError(f"Aucun tenant pour le schéma '{schema_name}'.")
+
+        if tenant.hibernated_at is not None:
+            raise CommandError(f"Le tenant '{schema_name}' est en hibernation : réveillez-le avant de le déplacer.")
+
+        source = get_tenant_database(tenant)
+        if target not in settings.DATABASES:
+            raise CommandError(f"La base '{target}' n'est pas définie dans DATABASES.")
+        if target == source:
+            raise CommandError(f"Le tenant '{schema_name}' est déjà sur la base '{target}'.")
+        if schema_exists_on(target, schema_name):
+            raise CommandError(f"Le schéma '{schema_name}' existe déjà sur la base '{target}'.")
+
+        self.stdout.write(f"Gel des écritures de '{schema_name}'...")
+        freeze_tenant(schema_name)
+        frozen_at = time.monotonic()
+        try:
+            time.sleep(options['drain'])
+
+            self.stdout.write(f"Copie de '{schema_name}' de '{source}' vers '{target}'...")
+            copy_schema_between(schema_name, source, target)
+
+            # Le déplacement n'est validé que si chaque table contient le même nombre de lignes
+            expected = schema_row_counts(source, schema_name)
+            copied = schema_row_counts(target, schema_name)
+            if expected != copied:
+                differences = sorted(
+                    table for table in set(expected) | set(copied) if expected.get(table) != copied.get(table)
+                )
+                drop_schema_on(target, schema_name)
+                raise CommandError(f"Copie incomplète, tables différentes : {', '.join(differences)}.")
+
+            Tenant.objects.filter(pk=tenant.pk).update(database=target)
+            # Remplace le gel : les processus web basculent immédiatement sur la nouvelle base
+            publish_placement(schema_name, target)
+        except CommandError:
+            clear_tenant_state(schema_name)
+            raise
+        except Exception as e:
+            clear_tenant_state(schema_name)
+            raise CommandError(f"Échec du déplacement de '{schema_name}' : {e}")
+
+        self.stdout.write(f"Écritures gelées pendant {time.monotonic() - frozen_at:.1f} s.")
+
+        if options['drop_source']:
+            drop_schema_on(source, schema_name)
+            self.stdout.write(f"Schéma d'origine supprimé de la base '{source}'.")
+        else:
+            self.stdout.write(f"Le schéma d'origine est conservé sur la base '{source}' (--drop-source pour le supprimer).")
+
+        self.stdout.write(self.style.SUCCESS(f"Tenant '{schema_name}' déplacé vers la base '{target}'."))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from kake.provisioning import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Exécute en arrière-plan les tâches de création de tenants en attente."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Traite les tâches en attente puis s'arrête au lieu d'attendre les suivantes.",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=2.0,
+            help="Délai en secondes entre deux vérifications de la file (défaut : 2).",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("En attente de tâches de création de tenants...")
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+
+            self.stdout.write(f"Création du tenant : {job.schema_name} (tentative {job.attempts})")
+            job = run_job(job)
+            if job.status == job.DONE:
+                self.stdout.write(self.style.SUCCESS(f"Tenant {job.schema_name} créé."))
+            else:
+                self.stderr.write(f"Erreur lors de la création de {job.schema_name} : {job.error}")
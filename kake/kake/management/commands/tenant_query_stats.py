@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand
+from kake.instrumentation import read_entries, clear_entries, summarize
+
+
+class Command(BaseCommand):
+    help = "Affiche les statistiques SQL par tenant et par vue collectées par QueryInstrumentationMiddleware."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help="Limite le rapport à un tenant.")
+        parser.add_argument('--limit', type=int, default=20, help="Nombre de lignes affichées (défaut : 20).")
+        parser.add_argument('--json', action='store_true', help="Affiche le rapport au format JSON.")
+        parser.add_argument('--clear', action='store_true', help="Vide le tampon après l'affichage.")
+
+    def handle(self, *args, **options):
+        entries = read_entries()
+        if options['schema']:
+            entries = [entry for entry in entries if entry['schema'] == options['schema']]
+        summary = summarize(entries)[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+        elif not summary:
+            self.stdout.write("Aucune mesure enregistrée.")
+        else:
+            self.stdout.write(f"{len(entries)} requête(s) HTTP mesurée(s) (temps en ms) :")
+            self.stdout.write(
+                f"{'schéma':<20} {'vue':<35} {'req.':>6} {'SQL moy.':>9} {'SQL max':>8} {'BD moy.':>9}"
+            )
+            for row in summary:
+                self.stdout.write(
+                    f"{row['schema']:<20} {row['view']:<35} {row['requests']:>6} "
+                    f"{row['avg_queries']:>9} {row['max_queries']:>8} {row['avg_db_time']:>9}"
+                )
+                if row['slowest']:
+                    self.stdout.write(f"    plus lente ({row['slowest']['time']} ms) : {row['slowest']['sql'][:200]}")
+
+        if options['clear']:
+            clear_entries()
+            self.stdout.write(self.style.SUCCESS("Tampon des mesures vidé."))
@@ -1,66 +1,181 @@
+from asgiref.sync import sync_to_async
 from django.utils.deprecation import MiddlewareMixin
-from django.db import connection
 from django.shortcuts import reverse
-from django.http import HttpResponseForbidden, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseRedirect
 from django.conf import settings
-from django.apps import apps
-import re
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .hibernation import is_hibernated, wake_tenant, record_activity
+from .resolver import resolve_tenant, tenant_cache, SCHEMA_NAME_RE
+from .sharding import tenant_state_enabled, hibernation_enabled, get_tenant_state
+from .tenant_manager import set_search_path, current_schema, current_tenant, current_database, get_tenant_database
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+def activate_schema(schema_name, database):
+    # La connexion est résolue dans le thread appelant : en ASGI, celui des vues synchrones
+    set_search_path(schema_name, connections[database])
+
+
+def resolve_on_public_schema(host):
+    # Modèles partagés : jamais lus sur le search_path laissé par la requête précédente
+    # (les schémas des tenants contiennent des copies vides de leurs tables)
+    activate_schema("public", DEFAULT_DB_ALIAS)
+    return resolve_tenant(host)
+
+
+def reset_request_context():
+    # Un thread WSGI garde le contexte de la requête précédente : chaque requête
+    # repart du schéma public, y compris sur les chemins qui ne configurent aucun tenant
+    current_tenant.set(None)
+    current_database.set(DEFAULT_DB_ALIAS)
+    current_schema.set("public")
 
 class TenantMiddleware(MiddlewareMixin):
-    def process_request(self, request):
-        # Obtenez le domaine hôte à partir de la requête
-        host = request.get_host()
-        Tenant = apps.get_model(settings.TENANT_MODEL)
+    sync_capable = True
+    async_capable = True
+    error_404_path = None
 
+    def get_error_404_path(self):
+        # L'URL 404 ne change pas d'une requête à l'autre : la calculer une seule fois
+        if self.error_404_path is None:
+            self.error_404_path = reverse(settings.URL404).lstrip("/")
+        return self.error_404_path
+
+    def is_public_host(self, host):
         # Supprimez le port si présent
         domain_without_port = host.split(":")[0]
 
+        # Liste des domaines publics à partir des paramètres
+        public_domains = getattr(settings, "TENANT_PUBLIC_DOMAINS", [])
+        return domain_without_port in public_domains or len(domain_without_port.split('.')) < 2
+
+    def prepare_tenant(self, tenant):
+        """
+        Lit l'état transitoire du tenant (déplacement, hibernation) et restaure
+        son schéma s'il est archivé. Retourne l'état à appliquer à la requête.
+        """
+        state = get_tenant_state(tenant.schema_name)
+        if is_hibernated(tenant) or (state and state.get("hibernated")):
+            # Tenant archivé : restauration transparente avant de servir la requête
+            activate_schema("public", DEFAULT_DB_ALIAS)
+            wake_tenant(tenant)
+            state = None
+        today = timezone.localdate()
+        if hibernation_enabled() and getattr(tenant, "last_activity", today) != today:
+            activate_schema("public", DEFAULT_DB_ALIAS)
+            record_activity(tenant)
+        return state
+
+    def configure_request(self, request, host, tenant, state=None):
+        """
+        Renseigne le tenant, sa base et l'urlconf de la requête. Retourne le
+        schéma à activer, ou une réponse d'erreur si l'hôte ne correspond à
+        aucun tenant ou si le tenant est gelé pendant un déplacement.
+        """
+        if tenant is None and not self.is_public_host(host):
+            # Validez le nom du schéma (alphanumérique et underscores uniquement)
+            if not SCHEMA_NAME_RE.match(host.split(":")[0].split('.')[0]):
+                return None, HttpResponseForbidden("Invalid schema name.")
+            # Redirigez vers la page 404
+            return None, HttpResponseRedirect(reverse(settings.URL404))
+
+        database = DEFAULT_DB_ALIAS if tenant is None else get_tenant_database(tenant)
+        if state:
+            # Tenant en cours de déplacement : seules les lectures sont servies
+            if state.get("frozen") and request.method not in SAFE_METHODS:
+                response = HttpResponse("Tenant temporarily read-only, please retry.", status=503)
+                response["Retry-After"] = "30"
+                return None, response
+            if state.get("database") and state["database"] != database:
+                # Le cache de résolution local connaît encore l'ancienne base
+                database = state["database"]
+                tenant_cache.delete(host)
+
+        request.tenant = tenant
+        # Le tenant reste lisible par le code asynchrone via kake.tenant_manager.get_current_tenant
+        current_tenant.set(tenant)
+        # Base utilisée par TenantRouter pour les modèles du tenant
+        current_database.set(database)
+        if tenant is None:
+            request.urlconf = getattr(settings, "ROOT_URLCONF")  # Charger les URL publiques
+            return "public", None
+
+        request.urlconf = getattr(settings, "TENANT_URLCONF")  # Charger les URL du locataire
+        return tenant.schema_name, None
+
+    def process_request(self, request):
+        reset_request_context()
+        # Obtenez le domaine hôte à partir de la requête
+        host = request.get_host()
+
         # Vérifiez si l'URL correspond à l'URL 404 pour éviter les boucles
         try:
-            error_404_url = reverse(settings.URL404).lstrip("/")
-            if request.path.lstrip("/") == error_404_url:
-                return  # Ne faites rien, laissez la vue gérer la requête
+            is_error_404_path = request.path.lstrip("/") == self.get_error_404_path()
         except Exception:
             # Si l'URL 404 n'est pas correctement définie
             return HttpResponseForbidden("Error configuring tenant: Invalid 404 URL")
+        if is_error_404_path:
+            # Laissez la vue gérer la requête, sur le schéma public
+            activate_schema("public", DEFAULT_DB_ALIAS)
+            return
 
-        # Liste des domaines publics à partir des paramètres
-        public_domains = getattr(settings, "TENANT_PUBLIC_DOMAINS", [])
+        try:
+            # Récupérez le locataire via le cache de résolution (domaine puis sous-domaine)
+            tenant = None
+            if not self.is_public_host(host):
+                found, tenant = tenant_cache.get(host)
+                if not found:
+                    tenant = resolve_on_public_schema(host)
+            state = self.prepare_tenant(tenant) if tenant is not None and tenant_state_enabled() else None
+            schema_name, response = self.configure_request(request, host, tenant, state)
+            if response is not None:
+                return response
 
-        if domain_without_port in public_domains:
-            schema_name = "public"
-            request.urlconf = getattr(settings, "ROOT_URLCONF")  # Charger les URL publiques
-        else:
-            domain_parts = domain_without_port.split('.')
+            # Mettez à jour le chemin de recherche PostgreSQL vers le schéma du locataire
+            # (aucun aller-retour si la connexion persistante y est déjà)
+            activate_schema(schema_name, current_database.get())
 
-            if len(domain_parts) < 2:
-                schema_name = "public"
-                request.urlconf = getattr(settings, "ROOT_URLCONF")
-            else:
-                schema_name = domain_parts[0]
+        except Exception as e:
+            print(f"Error configuring tenant: {str(e)}")  # Pour le débogage
+            return HttpResponseForbidden(f"Error configuring tenant: {str(e)}")
 
-                # Validez le nom du schéma (alphanumérique et underscores uniquement)
-                if not re.match(r'^[a-zA-Z0-9_]+$', schema_name):
-                    return HttpResponseForbidden("Invalid schema name.")
-                request.urlconf = getattr(settings, "TENANT_URLCONF")  # Charger les URL du locataire
+    async def __acall__(self, request):
+        """
+        Chemin ASGI : le tenant est lu dans le cache sans changer de thread ;
+        seuls un défaut de cache et le SET search_path passent par le thread
+        des vues synchrones, qui utilisent cette même connexion.
+        """
+        reset_request_context()
+        host = request.get_host()
 
         try:
-            # Récupérez le locataire pour le schéma actuel
-            if schema_name != "public":
-                tenant = Tenant.objects.get(schema_name=schema_name)
-                request.tenant = tenant
-            else:
-                tenant = None
-                request.tenant = None
+            is_error_404_path = request.path.lstrip("/") == self.get_error_404_path()
+        except Exception:
+            return HttpResponseForbidden("Error configuring tenant: Invalid 404 URL")
+        if is_error_404_path:
+            await sync_to_async(activate_schema)("public", DEFAULT_DB_ALIAS)
+            return await self.get_response(request)
 
-            # Mettez à jour le chemin de recherche PostgreSQL vers le schéma du locataire
-            with connection.cursor() as cursor:
-                cursor.execute("SET search_path TO %s;", [schema_name])
+        try:
+            tenant = None
+            if not self.is_public_host(host):
+                found, tenant = tenant_cache.get(host)
+                if not found:
+                    tenant = await sync_to_async(resolve_on_public_schema)(host)
+            state = None
+            if tenant is not None and tenant_state_enabled():
+                state = await sync_to_async(self.prepare_tenant)(tenant)
+            schema_name, response = self.configure_request(request, host, tenant, state)
+            if response is not None:
+                return response
 
-        except Tenant.DoesNotExist:
-            # Redirigez vers la page 404
-            return HttpResponseRedirect(reverse(settings.URL404))
+            await sync_to_async(activate_schema)(schema_name, current_database.get())
 
         except Exception as e:
             print(f"Error configuring tenant: {str(e)}")  # Pour le débogage
             return HttpResponseForbidden(f"Error configuring tenant: {str(e)}")
+
+        return await self.get_response(request)
@@ -14,6 +14,21 @@ class TenantMixin(models.Model):
         max_length=255, 
         help_text=_("Nom lisible associé à ce tenant.")
     )
+    database = models.CharField(
+        max_length=63,
+        default='default',
+        help_text=_("Alias de la base (settings.DATABASES) hébergeant le schéma de ce tenant.")
+    )
+    hibernated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text=_("Date d'archivage du schéma (tenant en hibernation), vide si le schéma est en base.")
+    )
+    last_activity = models.DateField(
+        null=True,
+        blank=True,
+        help_text=_("Dernier jour où le tenant a reçu une requête.")
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -48,3 +63,53 @@ class DomainMixin(models.Model):
 
     def __str__(self):
         return self.domain
+
+
+class ProvisioningJobMixin(models.Model):
+    """
+    Tâche de création d'un tenant, exécutée en arrière-plan étape par étape.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, _('En attente')),
+        (RUNNING, _('En cours')),
+        (DONE, _('Terminé')),
+        (FAILED, _('Échec')),
+    ]
+
+    tenant = models.ForeignKey(
+        settings.TENANT_MODEL,
+        on_delete=models.CASCADE,
+        related_name='provisioning_jobs',
+        help_text=_("Le tenant en cours de création.")
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text=_("Utilisateur recopié comme administrateur du tenant.")
+    )
+    schema_name = models.CharField(max_length=63)
+    domain = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    completed_steps = models.JSONField(
+        default=list,
+        blank=True,
+        help_text=_("Étapes déjà réalisées, ignorées lors d'une nouvelle tentative.")
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.schema_name} ({self.status})"
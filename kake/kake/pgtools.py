@@ -0,0 +1,105 @@
+import os
+import subprocess
+
+from django.db import connections
+
+
+def pg_environment(alias):
+    """
+    Variables d'environnement de connexion (libpq) pour la base `alias`,
+    afin de ne jamais passer le mot de passe en ligne de commande.
+    """
+    settings_dict = connections[alias].settings_dict
+    env = os.environ.copy()
+    variables = {
+        "PGHOST": settings_dict.get("HOST"),
+        "PGPORT": settings_dict.get("PORT"),
+        "PGUSER": settings_dict.get("USER"),
+        "PGPASSWORD": settings_dict.get("PASSWORD"),
+        "PGDATABASE": settings_dict.get("NAME"),
+        "PGSSLMODE": settings_dict.get("OPTIONS", {}).get("sslmode"),
+    }
+    env.update({key: str(value) for key, value in variables.items() if value})
+    return env
+
+
+def dump_command(schema_name):
+    # Format custom : compressé et restaurable avec pg_restore
+    return ["pg_dump", "--format=custom", "--no-owner", "--no-privileges", f"--schema={schema_name}"]
+
+
+def restore_command():
+    return ["pg_restore", "--no-owner", "--no-privileges", "--exit-on-error", "--single-transaction"]
+
+
+def copy_schema_between(schema_name, source, target):
+    """
+    Copie un schéma complet (structure, données, séquences) d'une base à une
+    autre en reliant pg_dump et pg_restore, sans fichier intermédiaire.
+    """
+    dump = subprocess.Popen(
+        dump_command(schema_name), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        env=pg_environment(source),
+    )
+    restore = subprocess.run(
+        restore_command() + ["--dbname", connections[target].settings_dict["NAME"]],
+        stdin=dump.stdout, capture_output=True, env=pg_environment(target),
+    )
+    dump.stdout.close()
+    dump_error = dump.stderr.read()
+    dump.wait()
+
+    if dump.returncode != 0:
+        raise RuntimeError(f"pg_dump a échoué : {dump_error.decode(errors='replace').strip()}")
+    if restore.returncode != 0:
+        raise RuntimeError(f"pg_restore a échoué : {restore.stderr.decode(errors='replace').strip()}")
+
+
+def dump_schema_to_file(alias, schema_name, path):
+    """
+    Archive un schéma dans un fichier pg_dump au format custom (compressé).
+    """
+    result = subprocess.run(
+        dump_command(schema_name) + ["--compress=9", "--file", str(path)],
+        capture_output=True, env=pg_environment(alias),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"pg_dump a échoué : {result.stderr.decode(errors='replace').strip()}")
+
+
+def restore_schema_from_file(alias, path):
+    """
+    Restaure en une transaction un schéma archivé par dump_schema_to_file.
+    """
+    result = subprocess.run(
+        restore_command() + ["--dbname", connections[alias].settings_dict["NAME"], str(path)],
+        capture_output=True, env=pg_environment(alias),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"pg_restore a échoué : {result.stderr.decode(errors='replace').strip()}")
+
+
+def schema_row_counts(alias, schema_name):
+    """
+    Nombre de lignes de chaque table du schéma, en une requête UNION ALL.
+    """
+    conn = connections[alias]
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_catalog.pg_class c "
+            "JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = %s AND c.relkind = 'r' ORDER BY c.relname;",
+            [schema_name],
+        )
+        tables = [row[0] for row in cursor.fetchall()]
+        if not tables:
+            return {}
+
+        quote = conn.ops.quote_name
+        cursor.execute(
+            " UNION ALL ".join(
+                f"SELECT %s, count(*) FROM {quote(schema_name)}.{quote(table)}" for table in tables
+            ),
+            tables,
+        )
+        return dict(cursor.fetchall())
@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+
+from django.conf import settings
+
+# Pools du processus, un par alias de base
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def is_reusable(raw):
+    """
+    Une connexion n'est rendue au pool que si elle est ouverte et hors
+    transaction (psycopg 2 et 3 exposent tous deux `closed` et `info`).
+    """
+    try:
+        return not raw.closed and raw.info.transaction_status == 0
+    except Exception:
+        return False
+
+
+class SchemaAffinityPool:
+    """
+    Connexions inactives d'une base, mémorisées avec leur search_path.
+    `acquire` privilégie une connexion déjà placée sur le schéma demandé :
+    le SET search_path, et l'invalidation des plans préparés qu'il entraîne,
+    sont alors évités. Fonctionne sur connexions directes comme derrière
+    pgbouncer en mode session.
+    """
+
+    def __init__(self, max_idle=8, max_age=600):
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self._idle = []  # (connexion, schéma, date de création), la plus récente en dernier
+        self._created_at = {}
+        self._lock = threading.Lock()
+        self.pid = os.getpid()
+        self.hits = self.misses = self.created = self.discarded = 0
+
+    def acquire(self, schema_name, connect):
+        """
+        Retourne (connexion, schéma sur lequel elle est placée ou None).
+        `connect` ouvre une nouvelle connexion lorsqu'aucune n'est disponible.
+        """
+        with self._lock:
+            self._check_fork()
+            entry = None
+            for position in range(len(self._idle) - 1, -1, -1):
+                if self._idle[position][1] == schema_name:
+                    entry = self._idle.pop(position)
+                    break
+            if entry is None and self._idle:
+                # Connexion la plus anciennement rendue : elle devra changer de schéma
+                entry = self._idle.pop(0)
+
+        if entry is not None:
+            raw, schema, created_at = entry
+            if is_reusable(raw) and (self.max_age is None or time.monotonic() - created_at < self.max_age):
+                with self._lock:
+                    if schema == schema_name:
+                        self.hits += 1
+                    else:
+                        self.misses += 1
+                return raw, schema
+            self.discard(raw)
+
+        raw = connect()
+        with self._lock:
+            self.created += 1
+            self._created_at[id(raw)] = time.monotonic()
+        return raw, None
+
+    def release(self, raw, schema_name):
+        """
+        Rend une connexion au pool avec son search_path (None s'il est inconnu).
+        Au-delà de `max_idle` connexions inactives, la plus ancienne est fermée.
+        """
+        if not is_reusable(raw):
+            self.discard(raw)
+            return
+
+        evicted = None
+        with self._lock:
+            if self._check_fork():
+                return
+            created_at = self._created_at.get(id(raw), time.monotonic())
+            self._idle.append((raw, schema_name, created_at))
+            if len(self._idle) > self.max_idle:
+                evicted = self._idle.pop(0)[0]
+        if evicted is not None:
+            self.discard(evicted)
+
+    def discard(self, raw):
+        with self._lock:
+            self._created_at.pop(id(raw), None)
+            self.discarded += 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """
+        Ferme toutes les connexions inactives du pool.
+        """
+        with self._lock:
+            if self._check_fork():
+                return
+            idle, self._idle = self._idle, []
+        for raw, _, _ in idle:
+            self.discard(raw)
+
+    def _check_fork(self):
+        # Après un fork, les connexions héritées appartiennent au processus parent :
+        # elles doivent avoir été fermées avant (close_pool), sinon leur libération
+        # par le ramasse-miettes de l'enfant coupe aussi celles du parent
+        if self.pid == os.getpid():
+            return False
+        self._idle, self._created_at = [], {}
+        self.pid = os.getpid()
+        self.hits = self.misses = self.created = self.discarded = 0
+        return True
+
+    def stats(self):
+        with self._lock:
+            acquired = self.hits + self.misses + self.created
+            return {
+                "pid": self.pid,
+                "idle": len(self._idle),
+                "idle_schemas": sorted({schema for _, schema, _ in self._idle if schema}),
+                "hits": self.hits,
+                "misses": self.misses,
+                "created": self.created,
+                "discarded": self.discarded,
+                "hit_ratio": round(self.hits / acquired, 3) if acquired else None,
+            }
+
+
+def get_pool(alias):
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = SchemaAffinityPool(
+                max_idle=getattr(settings, "TENANT_POOL_SIZE", 8),
+                max_age=getattr(settings, "TENANT_POOL_MAX_AGE", 600),
+            )
+        return _pools[alias]
+
+
+def close_pool(alias=None):
+    """
+    Ferme les connexions inactives du pool de `alias` (de tous les pools par
+    défaut). À appeler avant de créer des processus enfants par fork, après
+    connections.close_all() qui rend les connexions ouvertes au pool.
+    """
+    with _pools_lock:
+        if alias is None:
+            pools = list(_pools.values())
+        else:
+            pools = [_pools[alias]] if alias in _pools else []
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """
+    Compteurs des pools de ce processus, par alias de base.
+    """
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
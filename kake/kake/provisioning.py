@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .tenant_manager import get_provisioning_job_model, set_search_path
+from .views.mixins import TenantCreationMixin
+
+
+def enqueue_provisioning(tenant, schema_name, domain, user):
+    """
+    Enregistre la création du tenant dans la file ; elle sera exécutée par la
+    commande `run_provisioning_jobs` au lieu de bloquer la requête HTTP.
+    """
+    Job = get_provisioning_job_model()
+    return Job.objects.create(tenant=tenant, schema_name=schema_name, domain=domain, user=user)
+
+
+def get_stale_after():
+    """
+    Délai (secondes) sans progression au-delà duquel une tâche en cours est
+    considérée comme abandonnée par un runner interrompu (None pour désactiver).
+    """
+    return getattr(settings, "TENANT_PROVISIONING_STALE_AFTER", 1800)
+
+
+def stale_filter(Job):
+    # updated_at avance à chaque étape terminée : seule une tâche figée est visée
+    stale_after = get_stale_after()
+    if stale_after is None:
+        return Q(pk__in=[])
+    return Q(status=Job.RUNNING, updated_at__lt=timezone.now() - timedelta(seconds=stale_after))
+
+
+def is_stale(job):
+    return type(job).objects.filter(stale_filter(type(job)), pk=job.pk).exists()
+
+
+def claim_next_job():
+    """
+    Réserve la plus ancienne tâche en attente, ou une tâche en cours abandonnée
+    (voir get_stale_after) : elle reprend à l'étape interrompue. `skip_locked`
+    permet de lancer plusieurs runners sans qu'ils traitent la même tâche.
+    """
+    Job = get_provisioning_job_model()
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=Job.PENDING) | stale_filter(Job))
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.error = ''
+        job.save(update_fields=['status', 'attempts', 'error', 'updated_at'])
+    return job
+
+
+def run_job(job):
+    """
+    Exécute les étapes de création non encore réalisées. Chaque étape terminée
+    est enregistrée, de sorte qu'une nouvelle tentative reprend à l'étape en échec.
+    """
+    # Charger le tenant et l'utilisateur depuis le schéma public avant de changer de schéma
+    tenant, user = job.tenant, job.user
+    creator = TenantCreationMixin()
+
+    for step in creator.PROVISIONING_STEPS:
+        if step in job.completed_steps:
+            continue
+        try:
+            creator.run_provisioning_step(step, tenant.name, job.schema_name, job.domain, user)
+        except Exception as e:
+            set_search_path('public')
+            job.status = job.FAILED
+            job.error = f"{step} : {str(e)}"
+            job.save(update_fields=['status', 'error', 'updated_at'])
+            return job
+
+        # La tâche est stockée dans le schéma public
+        set_search_path('public')
+        job.completed_steps = job.completed_steps + [step]
+        job.save(update_fields=['completed_steps', 'updated_at'])
+
+    job.status = job.DONE
+    job.save(update_fields=['status', 'updated_at'])
+    return job
+
+
+def retry_job(job):
+    """
+    Remet dans la file une tâche en échec, ou en cours mais abandonnée par son
+    runner. Les étapes déjà réalisées ne sont pas rejouées.
+    """
+    if job.status != job.FAILED and not (job.status == job.RUNNING and is_stale(job)):
+        return False
+    job.status = job.PENDING
+    job.save(update_fields=['status', 'updated_at'])
+    return True
@@ -0,0 +1,198 @@
+import hashlib
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+from .tenant_manager import get_tenant_model, get_tenant_database
+
+# Préfixe commun à tous les tenants (voir kake.cache.SHARED_PREFIX)
+REPORT_PREFIX = "kake:report:"
+
+
+def get_report_cache():
+    return caches[getattr(settings, "TENANT_REPORT_CACHE", "default")]
+
+
+def get_report_models():
+    """
+    Modèles de tenant autorisés dans les rapports inter-tenants (TENANT_REPORT_MODELS).
+    """
+    return {label.lower(): apps.get_model(label) for label in getattr(settings, "TENANT_REPORT_MODELS", [])}
+
+
+class TenantReport:
+    """
+    Agrégat calculé dans chaque schéma de tenant, assemblé en une seule requête UNION ALL.
+
+    `columns` est une liste de (alias, expression SQL) évaluées sur la table du
+    modèle (alias `t`) ; `where` et `group_by` sont des fragments SQL optionnels,
+    `params` les paramètres de `where`. Ces fragments viennent du code, jamais
+    de la requête HTTP.
+    """
+
+    def __init__(self, name, model, columns, where=None, group_by=None, params=None):
+        self.name = name
+        self.model = model
+        self.columns = list(columns)
+        self.where = where
+        self.group_by = group_by
+        self.params = list(params or [])
+
+    @property
+    def column_names(self):
+        return ["schema_name"] + [alias for alias, _ in self.columns]
+
+    def get_model(self):
+        try:
+            return get_report_models()[self.model.lower()]
+        except KeyError:
+            raise ImproperlyConfigured(f"{self.model} n'est pas autorisé dans TENANT_REPORT_MODELS.")
+
+    def signature(self):
+        # Change avec la définition du rapport : les résultats mis en cache auparavant sont ignorés
+        definition = repr((self.model, self.columns, self.where, self.group_by, self.params))
+        return hashlib.md5(definition.encode()).hexdigest()[:12]
+
+    def branch_sql(self, schema_name, conn):
+        qn = conn.ops.quote_name
+        table = self.get_model()._meta.db_table
+        columns = ", ".join(f"{expression} AS {qn(alias)}" for alias, expression in self.columns)
+        sql = f"SELECT %s::text AS schema_name, {columns} FROM {qn(schema_name)}.{qn(table)} AS t"
+        if self.where:
+            sql += f" WHERE {self.where}"
+        if self.group_by:
+            sql += f" GROUP BY {self.group_by}"
+        return sql, [schema_name, *self.params]
+
+
+def tenant_watermarks(table, schema_names, conn):
+    """
+    Repère de dernière écriture de la table dans chaque schéma de la base `conn`,
+    lu en une requête : cumul des insertions, mises à jour et suppressions de
+    pg_stat_user_tables, accompagné de la date de remise à zéro des statistiques.
+    Un schéma absent du résultat ne possède pas (encore) la table dans cette base.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT s.schemaname,
+                   s.n_tup_ins + s.n_tup_upd + s.n_tup_del,
+                   coalesce(extract(epoch FROM d.stats_reset), 0)::bigint
+            FROM pg_catalog.pg_stat_user_tables s
+            LEFT JOIN pg_catalog.pg_stat_database d ON d.datname = current_database()
+            WHERE s.relname = %s AND s.schemaname = ANY(%s);
+            """,
+            [table, list(schema_names)],
+        )
+        return {schema: f"{reset}.{writes}" for schema, writes, reset in cursor.fetchall()}
+
+
+def get_tenant_schemas(schema_names=None):
+    """
+    Base hébergeant chaque schéma de tenant : {schema: alias}, par nom de schéma.
+    """
+    Tenant = get_tenant_model()
+    tenants = Tenant.objects.order_by("schema_name")
+    if schema_names is not None:
+        tenants = tenants.filter(schema_name__in=list(schema_names))
+    return {tenant.schema_name: get_tenant_database(tenant) for tenant in tenants}
+
+
+def run_report(report, schema_names=None, chunk_size=2000):
+    """
+    Génère les lignes (schema_name, colonnes...) du rapport pour chaque tenant.
+
+    Les résultats partiels d'un tenant sont mis en cache sous son repère de
+    dernière écriture : tant que ses tables n'ont pas changé, ils sont relus
+    sans requête. Les autres tenants sont lus dans la base qui les héberge
+    (champ `database`), par une seule requête UNION ALL par base lue par
+    blocs via un curseur côté serveur.
+
+    Les statistiques PostgreSQL étant publiées avec un léger différé (de
+    l'ordre de la seconde), une écriture toute récente peut ne pas encore
+    apparaître dans le rapport.
+    """
+    databases = get_tenant_schemas(schema_names)
+    by_database = defaultdict(list)
+    for schema, alias in databases.items():
+        by_database[alias].append(schema)
+
+    for alias in sorted(by_database):
+        yield from run_database_report(report, alias, by_database[alias], chunk_size)
+
+
+def run_database_report(report, alias, schema_names, chunk_size=2000):
+    """
+    Lignes du rapport pour les schémas hébergés par la base `alias`.
+    """
+    conn = connections[alias]
+    table = report.get_model()._meta.db_table
+    watermarks = tenant_watermarks(table, schema_names, conn)
+    cache = get_report_cache()
+    timeout = getattr(settings, "TENANT_REPORT_CACHE_TTL", 3600)
+
+    # La base fait partie de la clé : après un déplacement, la copie laissée à la source est ignorée
+    keys = {
+        schema: f"{REPORT_PREFIX}{report.name}:{report.signature()}:{alias}:{schema}:{watermark}"
+        for schema, watermark in watermarks.items()
+    }
+    cached = cache.get_many(list(keys.values()))
+
+    missing = []
+    for schema in schema_names:
+        if schema not in keys:
+            continue
+        if keys[schema] in cached:
+            for row in cached[keys[schema]]:
+                yield (schema, *row)
+        else:
+            missing.append(schema)
+
+    if not missing:
+        return
+
+    branches, params = [], []
+    for schema in missing:
+        sql, branch_params = report.branch_sql(schema, conn)
+        branches.append(sql)
+        params.extend(branch_params)
+
+    partials = defaultdict(list)
+    with conn.chunked_cursor() as cursor:
+        cursor.execute(" UNION ALL ".join(branches), params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                partials[row[0]].append(tuple(row[1:]))
+                yield tuple(row)
+
+    # Mis en cache une fois la lecture terminée, y compris pour les tenants sans ligne
+    cache.set_many({keys[schema]: partials.get(schema, []) for schema in missing}, timeout)
+
+
+def report_totals(report, rows, group_by=()):
+    """
+    Additionne les colonnes numériques des lignes de tous les tenants,
+    regroupées selon les colonnes `group_by` (par exemple le mois).
+    """
+    names = report.column_names
+    key_indexes = [names.index(column) for column in group_by]
+    value_indexes = [index for index in range(1, len(names)) if index not in key_indexes]
+
+    totals = {}
+    for row in rows:
+        key = tuple(row[index] for index in key_indexes)
+        current = totals.setdefault(key, {names[index]: 0 for index in value_indexes})
+        for index in value_indexes:
+            current[names[index]] += row[index] or 0
+
+    return [
+        {**dict(zip(group_by, key)), **values}
+        for key, values in sorted(totals.items(), key=lambda item: [str(part) for part in item[0]])
+    ]
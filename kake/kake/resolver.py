@@ -0,0 +1,60 @@
+import re
+
+from django.conf import settings
+
+from .tenant_manager import get_tenant_model, get_domain_model
+from .utils import LRUCache
+
+SCHEMA_NAME_RE = re.compile(r'^[a-zA-Z0-9_]+$')
+
+# Cache hôte -> tenant, partagé par toutes les requêtes du processus
+tenant_cache = LRUCache(
+    maxsize=getattr(settings, "TENANT_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "TENANT_CACHE_TTL", 300),
+)
+
+
+def resolve_tenant(host):
+    """
+    Retourne le tenant associé à l'hôte de la requête, ou None si aucun tenant
+    ne correspond. Le résultat (y compris l'absence de tenant) est mis en cache.
+    """
+    found, tenant = tenant_cache.get(host)
+    if found:
+        return tenant
+
+    tenant = lookup_tenant(host)
+    tenant_cache.set(host, tenant)
+    return tenant
+
+
+def lookup_tenant(host):
+    """
+    Résout le tenant en base : d'abord via le modèle Domain (domaines
+    personnalisés), puis via le sous-domaine interprété comme nom de schéma.
+    """
+    Tenant = get_tenant_model()
+    hostname = host.split(":")[0]
+
+    if getattr(settings, "DOMAIN_MODEL", None):
+        Domain = get_domain_model()
+        domain = (
+            Domain.objects.select_related("tenant")
+            .filter(domain__in={host, hostname})
+            .first()
+        )
+        if domain is not None:
+            return domain.tenant
+
+    schema_name = hostname.split(".")[0]
+    if not SCHEMA_NAME_RE.match(schema_name):
+        return None
+    return Tenant.objects.filter(schema_name=schema_name).first()
+
+
+def invalidate_tenant_cache():
+    """
+    Vide le cache de résolution. Appelé à chaque modification d'un tenant ou
+    d'un domaine, car un même tenant peut être servi par plusieurs hôtes.
+    """
+    tenant_cache.clear()
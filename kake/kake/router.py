@@ -1,22 +1,76 @@
+from django.apps import apps
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS
+from django.dispatch import receiver
+
+from .tenant_manager import get_current_database
+
+# Précalculés au premier routage, puis réutilisés pour chaque queryset
+_shared_apps = None
+_shared_models = {}
+
+
+def get_shared_apps():
+    """
+    Retourne l'ensemble des applications partagées. SHARED_APPS contient des
+    chemins ('apps.company') ou des labels ('company') : les deux sont retenus.
+    """
+    global _shared_apps
+    if _shared_apps is None:
+        shared = set(getattr(settings, 'SHARED_APPS', []))
+        for app_config in apps.get_app_configs():
+            if app_config.name in shared:
+                shared.add(app_config.label)
+        _shared_apps = frozenset(shared)
+    return _shared_apps
+
+
+def is_shared_model(model):
+    try:
+        return _shared_models[model]
+    except KeyError:
+        shared = model._meta.app_label in get_shared_apps()
+        _shared_models[model] = shared
+        return shared
+
+
+@receiver(setting_changed)
+def reset_routing_cache(setting, **kwargs):
+    global _shared_apps
+    if setting in ('SHARED_APPS', 'INSTALLED_APPS'):
+        _shared_apps = None
+        _shared_models.clear()
+
+
+def tenant_database():
+    # Base du tenant activée par TenantMiddleware ou tenant_context ; None laisse Django décider
+    database = get_current_database()
+    return None if database == DEFAULT_DB_ALIAS else database
+
 
 class TenantRouter:
+    """
+    Les applications partagées restent sur la base par défaut ; les modèles
+    de tenant suivent la base (shard) qui héberge le schéma du tenant actif.
+    """
+
     def db_for_read(self, model, **hints):
-        if model._meta.app_label in getattr(settings, 'SHARED_APPS', []):
+        if is_shared_model(model):
             return 'default'
-        return None
+        return tenant_database()
 
     def db_for_write(self, model, **hints):
-        if model._meta.app_label in getattr(settings, 'SHARED_APPS', []):
+        if is_shared_model(model):
             return 'default'
-        return None
+        return tenant_database()
 
     def allow_relation(self, obj1, obj2, **hints):
-        if obj1._meta.app_label in getattr(settings, 'SHARED_APPS', []) or obj2._meta.app_label in getattr(settings, 'SHARED_APPS', []):
+        if is_shared_model(obj1.__class__) or is_shared_model(obj2.__class__):
             return True
         return None
 
     def allow_migrate(self, db, app_label, model_name=None, **hints):
-        if app_label in getattr(settings, 'SHARED_APPS', []):
+        if app_label in get_shared_apps():
             return db == 'default'
         return None
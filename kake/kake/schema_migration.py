@@ -0,0 +1,215 @@
+import time
+from functools import lru_cache
+from io import StringIO
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection, connections, DEFAULT_DB_ALIAS
+from django.db.migrations.loader import MigrationLoader
+
+from .pool import close_pool
+from .tenant_manager import set_search_path
+
+# Table de suivi des migrations par tenant, toujours dans le schéma public
+STATE_TABLE = "public.kake_migration_state"
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def ensure_state_table():
+    """
+    Crée la table de suivi si elle n'existe pas encore.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+                schema_name varchar(63) PRIMARY KEY,
+                status varchar(20) NOT NULL,
+                started_at timestamptz NULL,
+                finished_at timestamptz NULL,
+                duration double precision NULL,
+                error text NOT NULL DEFAULT ''
+            );
+        """)
+
+
+def reset_state(schema_names):
+    """
+    Démarre un nouveau run : les tenants donnés repassent en attente. L'état
+    des autres tenants (par exemple ceux d'une autre base) est conservé.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {STATE_TABLE} WHERE schema_name = ANY(%s);", [list(schema_names)])
+    add_pending(schema_names)
+
+
+def add_pending(schema_names):
+    """
+    Ajoute en attente les tenants absents de la table (créés depuis le dernier run).
+    """
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {STATE_TABLE} (schema_name, status) VALUES (%s, %s) "
+            f"ON CONFLICT (schema_name) DO NOTHING;",
+            [(schema_name, PENDING) for schema_name in schema_names],
+        )
+
+
+def completed_schemas():
+    """
+    Retourne l'ensemble des schémas déjà migrés avec succès lors du run courant.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT schema_name FROM {STATE_TABLE} WHERE status = %s;", [DONE])
+        return {row[0] for row in cursor.fetchall()}
+
+
+def mark_up_to_date(schema_names):
+    """
+    Marque comme migrés les tenants ignorés car déjà à jour.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {STATE_TABLE} SET status = %s, started_at = now(), finished_at = now(), "
+            f"duration = 0, error = '' WHERE schema_name = ANY(%s);",
+            [DONE, list(schema_names)],
+        )
+
+
+@lru_cache(maxsize=None)
+def project_leaf_nodes():
+    """
+    Retourne les migrations feuilles du graphe du projet, sans accès à la base.
+    Le graphe ne change pas pendant la vie du processus : il est chargé une fois.
+    """
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    return frozenset(loader.graph.leaf_nodes())
+
+
+def up_to_date_schemas(schema_names, database=DEFAULT_DB_ALIAS):
+    """
+    Retourne les schémas dont la table django_migrations contient déjà toutes
+    les migrations feuilles du projet. Une requête au catalogue puis une seule
+    requête UNION ALL suffisent, quel que soit le nombre de tenants.
+    """
+    leaves = set(project_leaf_nodes())
+    if not leaves or not schema_names:
+        return set()
+
+    with connections[database].cursor() as cursor:
+        cursor.execute(
+            "SELECT n.nspname FROM pg_catalog.pg_class c "
+            "JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relname = 'django_migrations' AND c.relkind = 'r' AND n.nspname = ANY(%s);",
+            [list(schema_names)],
+        )
+        candidates = [row[0] for row in cursor.fetchall()]
+        if not candidates:
+            return set()
+
+        applied = " UNION ALL ".join(
+            f"SELECT %s AS schema_name, app, name FROM {connection.ops.quote_name(schema_name)}.django_migrations"
+            for schema_name in candidates
+        )
+        cursor.execute(
+            f"SELECT applied.schema_name FROM ({applied}) AS applied "
+            f"WHERE applied.app || '.' || applied.name = ANY(%s) "
+            f"GROUP BY applied.schema_name "
+            f"HAVING count(DISTINCT applied.app || '.' || applied.name) = %s;",
+            candidates + [[f"{app_label}.{name}" for app_label, name in leaves], len(leaves)],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def mark_state(schema_name, status, duration=None, error=""):
+    with connection.cursor() as cursor:
+        if status == RUNNING:
+            cursor.execute(
+                f"INSERT INTO {STATE_TABLE} (schema_name, status, started_at) VALUES (%s, %s, now()) "
+                f"ON CONFLICT (schema_name) DO UPDATE SET status = EXCLUDED.status, "
+                f"started_at = EXCLUDED.started_at, finished_at = NULL, duration = NULL, error = '';",
+                [schema_name, status],
+            )
+        else:
+            cursor.execute(
+                f"UPDATE {STATE_TABLE} SET status = %s, finished_at = now(), duration = %s, error = %s "
+                f"WHERE schema_name = %s;",
+                [status, duration, error, schema_name],
+            )
+
+
+def init_worker():
+    # Avec la méthode "spawn", le processus enfant doit initialiser Django lui-même
+    if not apps.ready:
+        django.setup()
+
+
+def migrate_schema(schema_name, verbosity=1, database=DEFAULT_DB_ALIAS):
+    """
+    Crée le schéma si nécessaire dans la base `database` puis applique les
+    migrations du projet. Retourne un dictionnaire décrivant le résultat
+    pour le rapport final.
+    """
+    started = time.monotonic()
+    mark_state(schema_name, RUNNING)
+
+    try:
+        conn = connections[database]
+        with conn.cursor() as cursor:
+            cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema_name};")
+        set_search_path(schema_name, conn)
+        output = None if verbosity else StringIO()
+        call_command('migrate', database=database, interactive=False, verbosity=verbosity, stdout=output)
+        status, error = DONE, ""
+    except Exception as e:
+        status, error = FAILED, str(e)
+
+    duration = time.monotonic() - started
+    mark_state(schema_name, status, duration, error)
+    return {
+        "schema_name": schema_name,
+        "status": status,
+        "duration": duration,
+        "error": error,
+    }
+
+
+def migrate_schemas(schema_names, jobs=1, verbosity=1, database=DEFAULT_DB_ALIAS):
+    """
+    Migre les schémas donnés et produit les résultats au fur et à mesure.
+    Avec jobs > 1, chaque schéma est migré dans un pool de processus où
+    chaque worker dispose de sa propre connexion à la base.
+    """
+    if jobs <= 1:
+        for schema_name in schema_names:
+            yield migrate_schema(schema_name, verbosity, database)
+        return
+
+    # Les workers ne doivent pas hériter de la connexion ouverte du parent, ni des
+    # connexions inactives du pool de kake (où close_all vient de la rendre)
+    connections.close_all()
+    close_pool()
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as executor:
+        futures = {
+            executor.submit(migrate_schema, schema_name, 0, database): schema_name
+            for schema_name in schema_names
+        }
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # Le worker a disparu avant de pouvoir enregistrer son résultat
+                schema_name = futures[future]
+                mark_state(schema_name, FAILED, None, str(e))
+                yield {
+                    "schema_name": schema_name,
+                    "status": FAILED,
+                    "duration": None,
+                    "error": str(e),
+                }
@@ -0,0 +1,71 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.dispatch import Signal
+
+# Envoyés par kake lorsqu'il crée ou supprime le schéma d'un tenant (argument : schema_name)
+schema_created = Signal()
+schema_dropped = Signal()
+
+
+class KnownSchemas:
+    """
+    Ensemble local au processus des schémas existants, chargé en une requête
+    par base depuis pg_namespace et rechargé après expiration du TTL ou
+    invalidation. Les noms de schéma étant uniques, les bases sont confondues.
+
+    Les signaux ne sont reçus que par le processus qui crée le schéma : un
+    schéma inconnu provoque donc un rechargement, au plus une fois toutes les
+    `miss_cooldown` secondes.
+    """
+
+    def __init__(self, ttl=60, miss_cooldown=5):
+        self.ttl = ttl
+        self.miss_cooldown = miss_cooldown
+        self._schemas = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._schemas is None or time.monotonic() - self._loaded_at > self.ttl:
+                schemas = set()
+                for alias in connections:
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute("SELECT nspname FROM pg_catalog.pg_namespace;")
+                        schemas.update(row[0] for row in cursor.fetchall())
+                self._schemas = schemas
+                self._loaded_at = time.monotonic()
+            return self._schemas
+
+    def __contains__(self, schema_name):
+        if schema_name in self.get():
+            return True
+        # Schéma peut-être créé par un autre processus (run_provisioning_jobs, bulk_create_tenants)
+        with self._lock:
+            reload = time.monotonic() - self._loaded_at > self.miss_cooldown
+            if reload:
+                self._schemas = None
+        return reload and schema_name in self.get()
+
+    def add(self, schema_name):
+        with self._lock:
+            if self._schemas is not None:
+                self._schemas.add(schema_name)
+
+    def discard(self, schema_name):
+        with self._lock:
+            if self._schemas is not None:
+                self._schemas.discard(schema_name)
+
+    def invalidate(self):
+        with self._lock:
+            self._schemas = None
+
+
+known_schemas = KnownSchemas(
+    ttl=getattr(settings, "TENANT_SCHEMA_CACHE_TTL", 60),
+    miss_cooldown=getattr(settings, "TENANT_SCHEMA_MISS_COOLDOWN", 5),
+)
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import caches
+
+# Préfixe commun à tous les tenants (voir kake.cache.SHARED_PREFIX)
+STATE_PREFIX = "kake:tenant-state:"
+
+
+def get_state_cache():
+    return caches[getattr(settings, "TENANT_STATE_CACHE", "default")]
+
+
+def sharding_enabled():
+    return len(settings.DATABASES) > 1
+
+
+def hibernation_enabled():
+    return bool(getattr(settings, "TENANT_HIBERNATION_DIR", None))
+
+
+def tenant_state_enabled():
+    # Sans shard ni hibernation, aucun tenant ne change d'état : pas de lecture de cache par requête
+    return sharding_enabled() or hibernation_enabled()
+
+
+def state_key(schema_name):
+    return f"{STATE_PREFIX}{schema_name}"
+
+
+def get_tenant_state(schema_name):
+    """
+    État transitoire d'un tenant partagé entre tous les processus web :
+    {"frozen": True} pendant un déplacement ou un archivage, puis
+    {"database": alias} ou {"hibernated": True} le temps que les caches de
+    résolution locaux expirent.
+    """
+    return get_state_cache().get(state_key(schema_name))
+
+
+def freeze_tenant(schema_name, timeout=3600):
+    # Le délai protège contre un gel oublié si la commande est interrompue brutalement
+    get_state_cache().set(state_key(schema_name), {"frozen": True}, timeout)
+
+
+def publish_state(schema_name, state):
+    # Conservé au-delà de la durée du cache de résolution des processus web
+    timeout = getattr(settings, "TENANT_CACHE_TTL", 300) + 60
+    get_state_cache().set(state_key(schema_name), state, timeout)
+
+
+def publish_placement(schema_name, database):
+    """
+    Annonce la nouvelle base du tenant aux processus dont le cache de
+    résolution contient encore l'ancienne.
+    """
+    publish_state(schema_name, {"database": database})
+
+
+def publish_hibernation(schema_name):
+    """
+    Annonce aux processus web que le schéma du tenant a été archivé.
+    """
+    publish_state(schema_name, {"hibernated": True})
+
+
+def clear_tenant_state(schema_name):
+    get_state_cache().delete(state_key(schema_name))
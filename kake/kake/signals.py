@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import invalidate_tenant
+from .resolver import invalidate_tenant_cache
+from .schemas import known_schemas, schema_created, schema_dropped
+from .tenant_manager import reset_search_path_tracking
+
+
+def is_tenant_model(sender):
+    return sender._meta.label_lower == settings.TENANT_MODEL.lower()
+
+
+def is_domain_model(sender):
+    domain_model = getattr(settings, "DOMAIN_MODEL", None)
+    return bool(domain_model) and sender._meta.label_lower == domain_model.lower()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_tenant_resolution(sender, **kwargs):
+    # Toute modification d'un tenant ou d'un domaine invalide la résolution des hôtes
+    if is_tenant_model(sender) or is_domain_model(sender):
+        invalidate_tenant_cache()
+
+
+@receiver(post_delete)
+def invalidate_deleted_tenant_cache(sender, instance, **kwargs):
+    # Les entrées de cache d'un tenant supprimé ne doivent pas survivre à sa recréation
+    if is_tenant_model(sender):
+        invalidate_tenant(instance.schema_name)
+        known_schemas.invalidate()
+
+
+@receiver(schema_created)
+def add_known_schema(sender, schema_name, **kwargs):
+    known_schemas.add(schema_name)
+
+
+@receiver(schema_dropped)
+def discard_known_schema(sender, schema_name, **kwargs):
+    known_schemas.discard(schema_name)
+
+
+@receiver(connection_created)
+def reset_tracked_search_path(sender, connection, **kwargs):
+    # Une nouvelle connexion démarre sur le search_path par défaut du serveur
+    reset_search_path_tracking(connection)
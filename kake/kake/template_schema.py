@@ -0,0 +1,147 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+
+from .schema_migration import up_to_date_schemas
+from .tenant_manager import set_search_path
+
+# Tables dont les lignes sont créées par les migrations ou le signal post_migrate
+# et doivent donc être recopiées dans chaque nouveau schéma.
+DEFAULT_SEED_TABLES = (
+    "django_migrations",
+    "django_content_type",
+    "auth_permission",
+    "django_site",
+)
+
+
+def get_template_schema():
+    """
+    Retourne le nom du schéma modèle, ou None si le clonage est désactivé.
+    """
+    return getattr(settings, "TENANT_TEMPLATE_SCHEMA", "kake_template")
+
+
+def template_is_current(template):
+    """
+    Le schéma modèle est utilisable s'il existe et contient toutes les
+    migrations feuilles du projet.
+    """
+    return template in up_to_date_schemas([template])
+
+
+def provision_schema(schema_name):
+    """
+    Crée le schéma d'un nouveau tenant. Le schéma modèle est cloné lorsqu'il est
+    à jour ; sinon les migrations complètes sont appliquées.
+    Retourne True si le schéma a été cloné.
+    """
+    template = get_template_schema()
+    if template and template_is_current(template):
+        clone_schema(template, schema_name)
+        return True
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema_name};")
+    set_search_path(schema_name)
+    call_command('migrate', interactive=False)
+    return False
+
+
+def clone_schema(source, target):
+    """
+    Copie la structure du schéma `source` (tables, index, contraintes,
+    séquences, clés étrangères) dans le nouveau schéma `target`, ainsi que les
+    lignes des tables d'amorçage. Le clonage est transactionnel.
+    """
+    quote = connection.ops.quote_name
+    seed_tables = getattr(settings, "TENANT_TEMPLATE_SEED_TABLES", DEFAULT_SEED_TABLES)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE SCHEMA {quote(target)};")
+
+            cursor.execute(
+                "SELECT c.relname FROM pg_catalog.pg_class c "
+                "JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = %s AND c.relkind IN ('r', 'p') AND NOT c.relispartition "
+                "ORDER BY c.relname;",
+                [source],
+            )
+            tables = [row[0] for row in cursor.fetchall()]
+
+            # Structure : colonnes, valeurs par défaut, identités, contraintes CHECK, index
+            for table in tables:
+                cursor.execute(
+                    f"CREATE TABLE {quote(target)}.{quote(table)} "
+                    f"(LIKE {quote(source)}.{quote(table)} INCLUDING ALL);"
+                )
+
+            # Colonnes serial : la valeur par défaut pointe encore vers la séquence du modèle
+            cursor.execute(
+                "SELECT c.relname, a.attname, s.relname FROM pg_catalog.pg_depend d "
+                "JOIN pg_catalog.pg_class s ON s.oid = d.objid AND s.relkind = 'S' "
+                "JOIN pg_catalog.pg_class c ON c.oid = d.refobjid "
+                "JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace "
+                "JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid AND a.attnum = d.refobjsubid "
+                "WHERE n.nspname = %s AND d.deptype = 'a';",
+                [source],
+            )
+            for table, column, sequence in cursor.fetchall():
+                cursor.execute(f"CREATE SEQUENCE {quote(target)}.{quote(sequence)};")
+                cursor.execute(
+                    f"ALTER TABLE {quote(target)}.{quote(table)} ALTER COLUMN {quote(column)} "
+                    f"SET DEFAULT nextval(%s::regclass);",
+                    [f"{quote(target)}.{quote(sequence)}"],
+                )
+                cursor.execute(
+                    f"ALTER SEQUENCE {quote(target)}.{quote(sequence)} "
+                    f"OWNED BY {quote(target)}.{quote(table)}.{quote(column)};"
+                )
+
+            # Données d'amorçage (types de contenu, permissions, historique des migrations...)
+            for table in seed_tables:
+                if table not in tables:
+                    continue
+                cursor.execute(
+                    f"INSERT INTO {quote(target)}.{quote(table)} "
+                    f"SELECT * FROM {quote(source)}.{quote(table)};"
+                )
+                cursor.execute(
+                    "SELECT a.attname FROM pg_catalog.pg_attribute a "
+                    "WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped;",
+                    [f"{quote(target)}.{quote(table)}"],
+                )
+                for (column,) in cursor.fetchall():
+                    cursor.execute(
+                        "SELECT pg_get_serial_sequence(%s, %s);",
+                        [f"{quote(target)}.{quote(table)}", column],
+                    )
+                    sequence = cursor.fetchone()[0]
+                    if sequence:
+                        cursor.execute(
+                            f"SELECT setval(%s, COALESCE((SELECT max({quote(column)}) "
+                            f"FROM {quote(target)}.{quote(table)}), 0) + 1, false);",
+                            [sequence],
+                        )
+
+        # Clés étrangères : lues depuis le schéma modèle pour que les tables
+        # référencées soient non qualifiées, puis recréées dans le nouveau schéma
+        set_search_path(source)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname, con.conname, pg_catalog.pg_get_constraintdef(con.oid) "
+                "FROM pg_catalog.pg_constraint con "
+                "JOIN pg_catalog.pg_class c ON c.oid = con.conrelid "
+                "JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = %s AND con.contype = 'f';",
+                [source],
+            )
+            foreign_keys = cursor.fetchall()
+
+        set_search_path(target)
+        with connection.cursor() as cursor:
+            for table, name, definition in foreign_keys:
+                cursor.execute(
+                    f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition};"
+                )
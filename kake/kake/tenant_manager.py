@@ -1,10 +1,22 @@
-from django.db import connection, IntegrityError
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from django.db import connection, connections, transaction, IntegrityError, DEFAULT_DB_ALIAS
 from django.conf import settings
 from django.apps import apps
 from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.core.management import call_command
 from django.core.management.base import BaseCommand
 
+from .schemas import schema_created, schema_dropped
+
+# Schema selected by the last set_search_path call in the current thread or task
+current_schema = ContextVar('kake_current_schema', default='public')
+# Tenant resolved by TenantMiddleware for the current request (None on public hosts)
+current_tenant = ContextVar('kake_current_tenant', default=None)
+# Database alias (shard) holding the current tenant's schema, used by TenantRouter
+current_database = ContextVar('kake_current_database', default=DEFAULT_DB_ALIAS)
+
 
 def get_tenant_model():
     try:
@@ -24,21 +36,105 @@ def get_domain_model():
         raise ImproperlyConfigured("DOMAIN_MODEL points to a non-existent model.")
 
 
+def get_provisioning_job_model():
+    try:
+        return apps.get_model(settings.TENANT_PROVISIONING_JOB_MODEL)
+    except AttributeError:
+        raise ImproperlyConfigured("TENANT_PROVISIONING_JOB_MODEL must be defined in settings.")
+    except LookupError:
+        raise ImproperlyConfigured("TENANT_PROVISIONING_JOB_MODEL points to a non-existent model.")
+
+
+def schema_exists(schema_name):
+    """
+    Check whether a PostgreSQL schema exists.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_catalog.pg_namespace WHERE nspname = %s;", [schema_name])
+        return cursor.fetchone() is not None
+
+
+def set_search_path(schema_name, conn=None):
+    """
+    Point the connection's search_path at the given schema.
+
+    The active schema is tracked on the connection wrapper so that the
+    SET round trip is skipped when a persistent connection is already on
+    that schema. Returns True when a SET was actually issued.
+    """
+    conn = conn or connection
+    current_schema.set(schema_name)
+    # Connect first: a connection recycled by kake's pool may already be on this schema
+    conn.ensure_connection()
+    if getattr(conn, 'kake_search_path', None) == schema_name:
+        return False
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET search_path TO %s;", [schema_name])
+    except Exception:
+        conn.kake_search_path = None
+        raise
+
+    if conn.in_atomic_block:
+        # A rollback would undo the SET: only trust it once the transaction commits
+        conn.kake_search_path = None
+        transaction.on_commit(
+            lambda: setattr(conn, 'kake_search_path', schema_name), using=conn.alias
+        )
+    else:
+        conn.kake_search_path = schema_name
+    return True
+
+
+def get_current_schema():
+    """
+    Return the schema the current request or job is working in.
+    """
+    return current_schema.get()
+
+
+def get_current_tenant():
+    """
+    Return the tenant of the current request; usable from sync and async code.
+    """
+    return current_tenant.get()
+
+
+def get_current_database():
+    """
+    Return the database alias the current request or job routes tenant models to.
+    """
+    return current_database.get()
+
+
+def get_tenant_database(tenant):
+    """
+    Return the database alias hosting the tenant's schema.
+    """
+    return getattr(tenant, 'database', None) or DEFAULT_DB_ALIAS
+
+
+def reset_search_path_tracking(conn=None):
+    """
+    Forget the tracked schema so that the next set_search_path issues a SET.
+    """
+    conn = conn or connection
+    conn.kake_search_path = None
+
+
 def migrate_tenant_schemas():
     Tenant = get_tenant_model()
     tenants = Tenant.objects.all()
 
-    for tenant in tenants:
-        with connection.cursor() as cursor:
-            # Set search_path to the tenant schema
-            cursor.execute(f"SET search_path TO {tenant.schema_name};")
-            print(f"Migrating schema: {tenant.schema_name}")
-            
-            # Execute migrations for this specific schema
-            try:
-                call_command('migrate', database=tenant.schema_name, interactive=False)
-            except Exception as e:
-                print(f"Error migrating schema {tenant.schema_name}: {str(e)}")
+    for tenant in each_tenant(tenants):
+        print(f"Migrating schema: {tenant.schema_name}")
+
+        # Execute migrations for this specific schema
+        try:
+            call_command('migrate', database=tenant.schema_name, interactive=False)
+        except Exception as e:
+            print(f"Error migrating schema {tenant.schema_name}: {str(e)}")
 
 
 def create_tenant(name, schema_name, domain):
@@ -58,6 +154,7 @@ def create_tenant(name, schema_name, domain):
         # Create the schema
         with connection.cursor() as cursor:
             cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema_name};")
+        schema_created.send(sender=None, schema_name=schema_name)
 
         # Create the tenant
         tenant = Tenant.objects.create(name=name, schema_name=schema_name)
@@ -73,20 +170,100 @@ def create_tenant(name, schema_name, domain):
         # Drop the schema if something goes wrong
         with connection.cursor() as cursor:
             cursor.execute(f"DROP SCHEMA IF EXISTS {schema_name} CASCADE;")
+        schema_dropped.send(sender=None, schema_name=schema_name)
         raise ValidationError(f"Critical error while creating the tenant: {str(e)}")
 
 
 def switch_tenant(schema_name):
     """
     Switch the database schema to the specified tenant schema.
+    The previous schema is not restored: prefer tenant_context for scoped work.
     """
     try:
-        with connection.cursor() as cursor:
-            cursor.execute("SET search_path TO %s;", [schema_name])
+        set_search_path(schema_name)
     except Exception as e:
         raise ValidationError(f"Unable to switch schema: {str(e)}")
 
 
+class tenant_context(ContextDecorator):
+    """
+    Run a block, or a function when used as a decorator, inside a tenant schema.
+
+    Accepts a tenant instance or a schema name. A tenant instance also
+    selects the database its schema lives on. The previous schema (and
+    tenant and database) is restored on exit, so contexts nest; thanks to
+    the tracking in set_search_path, no SET is issued when the connection is
+    already on the requested schema.
+    """
+
+    def __init__(self, tenant, conn=None):
+        self.tenant = tenant
+        self.conn = conn
+        self.schema_name = getattr(tenant, 'schema_name', tenant)
+        self.previous_schema = None
+        self.previous_connection = None
+        self.tenant_token = None
+        self.database_token = None
+
+    def _recreate_cm(self):
+        # A decorated function may run concurrently or recursively: one state per call
+        return self.__class__(self.tenant, self.conn)
+
+    def __enter__(self):
+        # Restored on exit: with nested tenants on different shards, the outer
+        # schema belongs to the outer tenant's database, not the inner one's
+        self.previous_connection = self.get_connection()
+        if not isinstance(self.tenant, str):
+            self.tenant_token = current_tenant.set(self.tenant)
+            self.database_token = current_database.set(get_tenant_database(self.tenant))
+        self.previous_schema = get_current_schema()
+        set_search_path(self.schema_name, self.get_connection())
+        return self.tenant
+
+    def get_connection(self):
+        return self.conn or connections[get_current_database()]
+
+    def __exit__(self, *exc_info):
+        try:
+            set_search_path(self.previous_schema, self.previous_connection)
+        finally:
+            if self.tenant_token is not None:
+                current_tenant.reset(self.tenant_token)
+                current_database.reset(self.database_token)
+                self.tenant_token = self.database_token = None
+        return False
+
+
+def with_tenant(tenant, conn=None):
+    """
+    Decorator form of tenant_context: @with_tenant('farm_a').
+    """
+    return tenant_context(tenant, conn)
+
+
+def each_tenant(tenants=None, conn=None, **filters):
+    """
+    Iterate over tenants, each loop body running inside its schema.
+
+    `tenants` is a queryset or iterable of tenants (by default all tenants
+    whose schema is not hibernated, narrowed by `filters`). Every schema of a database is visited on the
+    same connection, only the search_path changes; the previous schema is
+    restored when the loop ends, including on break or error.
+    """
+    if tenants is None:
+        tenants = (
+            get_tenant_model().objects.filter(hibernated_at__isnull=True, **filters)
+            .order_by('database', 'schema_name')
+        )
+    elif filters:
+        tenants = tenants.filter(**filters)
+
+    # The tenant table lives in public: read it entirely before switching schemas
+    for tenant in list(tenants):
+        with tenant_context(tenant, conn):
+            yield tenant
+
+
 class Command(BaseCommand):
     help = "Performs migrations for each existing tenant schema, creating the schema if necessary."
 
@@ -106,10 +283,9 @@ class Command(BaseCommand):
 
             # Set the search_path to the current tenant schema
             try:
-                with connection.cursor() as cursor:
-                    cursor.execute(f"SET search_path TO {tenant.schema_name};")
-                    self.stdout.write(f"Migrating schema: {tenant.schema_name}")
-                    call_command('migrate', interactive=False)
+                set_search_path(tenant.schema_name)
+                self.stdout.write(f"Migrating schema: {tenant.schema_name}")
+                call_command('migrate', interactive=False)
             except OperationalError as e:
                 self.stderr.write(f"Error during migration for {tenant.schema_name}: {str(e)}")
 
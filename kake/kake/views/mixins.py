@@ -4,48 +4,19 @@ from django.core.exceptions import ValidationError
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.contrib.auth import get_user_model
+from kake.tenant_manager import set_search_path, schema_exists
+from kake.template_schema import provision_schema
+from kake.schemas import schema_created, schema_dropped
 
 class TenantCreationMixin:
+    # Étapes de création, exécutables séparément (et rejouables) par le runner de tâches
+    PROVISIONING_STEPS = ('schema', 'admin_user', 'site')
+
     def create_and_migrate_tenant(self, name, schema_name, domain,user):
         try:
-            # Création du schéma
-            with connection.cursor() as cursor:
-                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema_name};")
-
-            # Migration des schémas
-            with connection.cursor() as cursor:
-                # Utilisation de schema_name au lieu de tenant.schema_name
-                cursor.execute(f"SET search_path TO {schema_name};")
-                call_command('migrate', interactive=False)
-                User = get_user_model()
-                
-
-                if not user.email:
-                    raise ValueError("L'utilisateur connecté doit avoir un email pour créer un superutilisateur.")
-
-                User.objects.create(
-                    username=user.username or f"default_{user.id}",  # Générer un username par défaut si manquant
-                    email=user.email,
-                    password=user.password or "default_password",   # Fournir un mot de passe par défaut en cas d'absence
-                    role='admin',
-                    is_active=True
-                )
-            
-
-            # Synchronisation avec le modèle Site
-            full_domain = f"{domain}"
-            default_site = Site.objects.get(id=1)  # Récupérer le site par défaut avec l'ID 1
-            default_site.domain = full_domain     # Mettre à jour le domaine avec le tenant
-            default_site.name = name              # Mettre à jour le nom avec celui du tenant
-            default_site.save()
-
-            # Synchronisation ou création d'un nouveau site si nécessaire
-            site, created = Site.objects.update_or_create(
-                domain=full_domain,
-                defaults={"name": name},
-            )
-
-
+            self.create_tenant_schema(schema_name)
+            self.create_tenant_admin(schema_name, user)
+            self.sync_tenant_site(schema_name, name, domain)
 
             # Retourner une réponse de succès
             return {
@@ -56,4 +27,61 @@ class TenantCreationMixin:
             # Supprimer le schéma en cas d'échec
             with connection.cursor() as cursor:
                 cursor.execute(f"DROP SCHEMA IF EXISTS {schema_name} CASCADE;")
+            schema_dropped.send(sender=self.__class__, schema_name=schema_name)
             raise ValidationError(f"Erreur critique : {str(e)}")
+
+    def run_provisioning_step(self, step, name, schema_name, domain, user):
+        if step == 'schema':
+            self.create_tenant_schema(schema_name)
+        elif step == 'admin_user':
+            self.create_tenant_admin(schema_name, user)
+        elif step == 'site':
+            self.sync_tenant_site(schema_name, name, domain)
+        else:
+            raise ValueError(f"Étape de création inconnue : {step}")
+
+    def create_tenant_schema(self, schema_name):
+        if schema_exists(schema_name):
+            # Reprise après échec : migrate n'applique que les migrations manquantes
+            set_search_path(schema_name)
+            call_command('migrate', interactive=False)
+        else:
+            # Création du schéma : clonage du schéma modèle s'il est à jour,
+            # sinon application complète des migrations
+            provision_schema(schema_name)
+            schema_created.send(sender=self.__class__, schema_name=schema_name)
+
+    def create_tenant_admin(self, schema_name, user):
+        if not user.email:
+            raise ValueError("L'utilisateur connecté doit avoir un email pour créer un superutilisateur.")
+
+        # Utilisation de schema_name au lieu de tenant.schema_name
+        set_search_path(schema_name)
+        User = get_user_model()
+
+        if User.objects.filter(email=user.email).exists():
+            return
+
+        User.objects.create(
+            username=user.username or f"default_{user.id}",  # Générer un username par défaut si manquant
+            email=user.email,
+            password=user.password or "default_password",   # Fournir un mot de passe par défaut en cas d'absence
+            role='admin',
+            is_active=True
+        )
+
+    def sync_tenant_site(self, schema_name, name, domain):
+        set_search_path(schema_name)
+
+        # Synchronisation avec le modèle Site
+        full_domain = f"{domain}"
+        default_site = Site.objects.get(id=1)  # Récupérer le site par défaut avec l'ID 1
+        default_site.domain = full_domain     # Mettre à jour le domaine avec le tenant
+        default_site.name = name              # Mettre à jour le nom avec celui du tenant
+        default_site.save()
+
+        # Synchronisation ou création d'un nouveau site si nécessaire
+        site, created = Site.objects.update_or_create(
+            domain=full_domain,
+            defaults={"name": name},
+        )